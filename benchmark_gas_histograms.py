@@ -0,0 +1,126 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import whale_analytics
+import whale_gas
+
+PERCENTILES = (50, 90, 99)
+KINDS = ('ProgrammableTransaction', 'ConsensusCommitPrologue', 'ChangeEpoch')
+
+# 分箱內線性內插的誤差上限為一個分箱的相對寬度 (約 4.7%)，超過即代表合併結果有誤
+MAX_RELATIVE_ERROR = 10 ** (1 / whale_gas.BINS_PER_DECADE) - 1
+
+
+def make_transactions(n_rows, n_days, n_whales, seed=0):
+    """產生與 whale_sui_top1_sui_transactions.xlsx 欄位相同的模擬交易 (Gas 以對數常態分佈，部分為負的 rebate)。"""
+    rng = np.random.default_rng(seed)
+    start_ms = int(pd.Timestamp("2024-01-01").timestamp() * 1000)
+    gas = rng.lognormal(mean=14.4, sigma=0.8, size=n_rows)
+    rebate = rng.random(n_rows) < 0.05
+    gas[rebate] = -rng.lognormal(mean=16.5, sigma=0.6, size=rebate.sum())
+    return pd.DataFrame({
+        'timestamp_ms': start_ms + rng.integers(0, n_days * 86_400_000, size=n_rows),
+        'sender': np.array([f"0x{i:064x}" for i in range(n_whales)])[rng.integers(0, n_whales, size=n_rows)],
+        'transaction_kind': np.array(KINDS)[rng.choice(len(KINDS), size=n_rows, p=[0.9, 0.07, 0.03])],
+        'total_gas_cost': gas.round().astype(np.int64),
+    })
+
+
+def best_of(func, repeat):
+    """執行 repeat 次並回傳 (最短耗時秒數, 最後一次的結果)。"""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較預先彙總直方圖與掃描原始交易計算 Gas 百分位數的效能。")
+    parser.add_argument("--rows", type=int, default=2_000_000, help="模擬交易筆數")
+    parser.add_argument("--days", type=int, default=365, help="模擬的天數")
+    parser.add_argument("--whales", type=int, default=10, help="模擬的鯨魚數量")
+    parser.add_argument("--repeat", type=int, default=5, help="每項測量重複次數 (取最短)")
+    args = parser.parse_args()
+
+    transactions = make_transactions(args.rows, args.days, args.whales)
+    print(f"模擬交易：{args.rows:,} 筆，{args.days} 天，{args.whales} 位鯨魚")
+
+    ingest_seconds, histograms = best_of(lambda: whale_gas.build_daily_histograms(transactions), 1)
+    print(f"匯入時預先彙總直方圖：{ingest_seconds:.3f} 秒 (分組數 {len(histograms['dates']):,}，分箱數 {whale_gas.N_BINS})")
+
+    # 原始掃描的對照組：日期欄位事先解析好，只計算篩選與百分位數本身
+    days = pd.to_datetime(transactions['timestamp_ms'], unit='ms').dt.floor('D').to_numpy()
+    gas = transactions['total_gas_cost'].to_numpy(dtype=np.float64)
+    start_date = pd.Timestamp("2024-01-01")
+
+    print()
+    print(f"{'範圍 (天)':>10} {'原始掃描 (ms)':>16} {'預解析掃描 (ms)':>18} {'直方圖合併 (ms)':>18} {'加速倍數':>10} {'最大相對誤差':>14}")
+    for span in (7, 30, 90, args.days):
+        end_date = start_date + pd.Timedelta(days=span - 1)
+
+        raw_seconds, exact = best_of(
+            lambda: whale_gas.raw_scan_percentiles(transactions, PERCENTILES, start_date, end_date), args.repeat)
+
+        def pre_parsed_scan():
+            mask = (days >= start_date.to_datetime64()) & (days <= end_date.to_datetime64())
+            return np.percentile(gas[mask], PERCENTILES)
+        scan_seconds, _ = best_of(pre_parsed_scan, args.repeat)
+
+        hist_seconds, summary = best_of(
+            lambda: whale_gas.gas_summary(histograms, PERCENTILES, by=None, start_date=start_date, end_date=end_date),
+            args.repeat)
+        estimate = summary[[f"p{p}_sui" for p in PERCENTILES]].to_numpy()[0] * whale_analytics.MIST_PER_SUI
+        error = np.max(np.abs(estimate - exact) / np.abs(exact))
+
+        print(f"{span:>10} {raw_seconds * 1000:>16.2f} {scan_seconds * 1000:>18.2f} {hist_seconds * 1000:>18.2f} "
+              f"{scan_seconds / hist_seconds:>9.1f}x {error:>13.2%}")
+
+    # 依交易類型或鯨魚分組時標籤排序會打亂分組順序，逐組與原始掃描比對交易數與百分位數，不符時以非零狀態結束
+    end_date = start_date + pd.Timedelta(days=args.days - 1)
+    failures = check_grouped(transactions, histograms, start_date, end_date, 'kind', 'transaction_kind', KINDS)
+    addresses = sorted(transactions['sender'].unique())
+    failures += check_grouped(transactions, histograms, start_date, end_date, 'address', 'sender', addresses)
+    if failures:
+        print()
+        for failure in failures:
+            print(f"錯誤：{failure}")
+        sys.exit(1)
+    print()
+    print(f"分組結果與原始掃描一致 (交易數相同，相對誤差 < {MAX_RELATIVE_ERROR:.1%})")
+
+
+def check_grouped(transactions, histograms, start_date, end_date, by, column, groups):
+    """比對 gas_summary(by=...) 與逐組原始掃描的結果，回傳不符的項目說明。"""
+    summary = whale_gas.gas_summary(histograms, PERCENTILES, by=by, start_date=start_date, end_date=end_date)
+    print()
+    print(f"{by:>24} {'交易數':>10} {'原始交易數':>10} {'最大相對誤差':>14}")
+    failures = []
+    for group in groups:
+        filters = {'kinds': [group]} if by == 'kind' else {'addresses': [group]}
+        exact = whale_gas.raw_scan_percentiles(transactions, PERCENTILES, start_date, end_date, **filters)
+        raw_count = int((transactions[column] == group).sum())
+        rows = summary[summary['group'] == group]
+        if rows.empty:
+            failures.append(f"{by}={group} 沒有彙總結果")
+            continue
+        row = rows.iloc[0]
+        estimate = row[[f"p{p}_sui" for p in PERCENTILES]].to_numpy(dtype=np.float64) * whale_analytics.MIST_PER_SUI
+        error = np.max(np.abs(estimate - exact) / np.abs(exact))
+        label = group if len(group) <= 24 else f"{group[:6]}...{group[-4:]}"
+        print(f"{label:>24} {int(row['transactions']):>10,} {raw_count:>10,} {error:>13.2%}")
+        if int(row['transactions']) != raw_count:
+            failures.append(f"{by}={group} 交易數 {int(row['transactions'])} 與原始交易數 {raw_count} 不符")
+        if not error < MAX_RELATIVE_ERROR:
+            failures.append(f"{by}={group} 百分位數相對誤差 {error:.2%} 超過 {MAX_RELATIVE_ERROR:.1%}")
+    return failures
+
+
+# --- 主程式執行區 ---
+if __name__ == "__main__":
+    main()
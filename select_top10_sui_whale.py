@@ -1,15 +1,18 @@
 import pandas as pd
 import os
+from datetime import date
 
-def get_top_10_whales(file_path):
+import whale_rank_history
+
+def load_whale_holders(file_path):
     """
-    從指定的 Excel 檔案中讀取數據，並回傳持有量最大的前 10 名鯨魚。
+    從指定的 Excel 檔案中讀取所有持有者數據，並依持有量降序排序。
 
     Args:
         file_path (str): Excel 檔案的路徑。
 
     Returns:
-        pandas.DataFrame: 一個包含前 10 名鯨魚數據的 DataFrame，
+        pandas.DataFrame: 包含 'owner_address' 與 'total_sui' 欄位的 DataFrame，
                           如果檔案不存在或格式錯誤則回傳 None。
     """
     try:
@@ -40,12 +43,7 @@ def get_top_10_whales(file_path):
         df.dropna(subset=[balance_col], inplace=True)
 
         # 根據 'total_sui' 欄位進行降序排序
-        sorted_df = df.sort_values(by=balance_col, ascending=False)
-
-        # 選取前 10 筆紀錄
-        top_10 = sorted_df.head(10)
-
-        return top_10
+        return df.sort_values(by=balance_col, ascending=False)
 
     except FileNotFoundError:
         print(f"錯誤：找不到檔案 '{file_path}'。請確認檔案路徑是否正確。")
@@ -54,14 +52,33 @@ def get_top_10_whales(file_path):
         print(f"讀取或處理檔案時發生錯誤：{e}")
         return None
 
+def get_top_10_whales(file_path):
+    """
+    從指定的 Excel 檔案中讀取數據，並回傳持有量最大的前 10 名鯨魚。
+
+    Args:
+        file_path (str): Excel 檔案的路徑。
+
+    Returns:
+        pandas.DataFrame: 一個包含前 10 名鯨魚數據的 DataFrame，
+                          如果檔案不存在或格式錯誤則回傳 None。
+    """
+    holders_df = load_whale_holders(file_path)
+    if holders_df is None:
+        return None
+
+    # 選取前 10 筆紀錄
+    return holders_df.head(10)
+
 # --- 主程式執行區 ---
 if __name__ == "__main__":
     # 定義您的輸入和輸出檔案路徑
     input_file = "data/whale_sui.xlsx"
     output_file = "data/top10_sui_whale.xlsx"
     
-    # 呼叫函數來取得前 10 大鯨魚
-    top_whales_df = get_top_10_whales(input_file)
+    # 讀取所有持有者，並取得前 10 大鯨魚
+    holders_df = load_whale_holders(input_file)
+    top_whales_df = holders_df.head(10) if holders_df is not None else None
     
     # 如果成功取得數據，就將結果印出來並儲存成新檔案
     if top_whales_df is not None:
@@ -83,3 +100,8 @@ if __name__ == "__main__":
         except Exception as e:
             print(f"\n儲存檔案時發生錯誤：{e}")
 
+        # 將本次持有者快照寫入排名歷史，記錄進榜、出榜與名次變化
+        rank_events = whale_rank_history.record_snapshot(holders_df, date.today())
+        if rank_events is not None:
+            print(f"已更新排名歷史 '{whale_rank_history.DEFAULT_HISTORY_PATH}'，本次共有 {len(rank_events)} 筆排名變化。")
+
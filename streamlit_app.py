@@ -10,9 +10,14 @@ import random
 import time
 from pathlib import Path
 import base64
-
-# 提示：為了使用 SQL 查詢功能，您可能需要安裝一個額外的套件。
-# 請在您的終端機中執行： pip install pandasql
+import tempfile
+import numpy as np
+import whale_cohort
+import whale_rank_history
+import whale_export
+import whale_analytics
+import whale_anomaly
+import whale_gas
 
 # --- 頁面配置 (請務必放在所有 st 指令之前) ---
 st.set_page_config(
@@ -95,65 +100,7 @@ def get_gemini_response(prompt, data_df, context_view):
     if not model:
         return "AI 模型未設定，請檢查您的 API 金鑰。"
 
-    base_prompt = """
-    你是一位專業、友善的加密貨幣數據分析助理。你的職責是根據使用者當前的操作頁面，提供對應的幫助。
-    """
-
-    context_prompt = ""
-    # 根據視圖提供不同的上下文和指示
-    if context_view == '圖表分析':
-        if data_df is not None and not data_df.empty:
-            data_context = data_df.to_csv(index=False)
-            context_prompt = f"""
-            使用者正在查看 SUI 鯨魚的每日持有量變化圖表。請根據以下的數據 CSV，回答他的問題，並提供簡潔、專業的見解。
-
-            --- 圖表數據 ---
-            {data_context}
-            --- 數據結束 ---
-            """
-    elif context_view == 'SQL查詢':
-        if data_df is not None and not data_df.empty:
-            data_context = ", ".join(data_df.columns)
-            context_prompt = f"""
-            使用者正在 SQL 查詢工作區，希望能查詢名為 `top1_transactions` 的表格。
-            - 如果使用者想知道如何查詢，請幫他生成一段符合需求的 SQL 程式碼。
-            - 如果使用者詢問欄位意義，請根據欄位名稱進行解釋 (例如 `transaction_digest` 是交易哈希值)。
-            - **絕對不要**自己執行查詢，僅提供 SQL 程式碼或解釋。
-
-            可用的欄位如下:
-            `{data_context}`
-            """
-    elif context_view == '資金流向追蹤':
-        if data_df is not None and not data_df.empty:
-            data_context = data_df.to_csv(index=False)
-            context_prompt = f"""
-            使用者正在查看 Top 1 鯨魚的資金流向追蹤圖表。請根據以下的數據 CSV，回答他的問題或提供見解，例如分析哪個協議是該鯨魚最主要的資金去向。
-
-            --- 圖表數據 ---
-            {data_context}
-            --- 數據結束 ---
-            """
-
-    elif context_view == '投資組合分析':
-        if data_df is not None and not data_df.empty:
-            data_context = data_df.to_csv(index=False)
-            context_prompt = f"""
-            使用者正在查看 Top 1 鯨魚的資產投資組合分佈。請根據以下的數據 CSV，回答他的問題或提供見解，例如分析該鯨魚的資產主要集中在哪種類型的投資，以及哪個協議佔比最高。
-
-            --- 投資組合數據 ---
-            {data_context}
-            --- 數據結束 ---
-            """
-
-    full_prompt = f"""
-    {base_prompt}
-    {context_prompt}
-
-    使用者的問題是：
-    "{prompt}"
-
-    請用繁體中文回答。
-    """
+    full_prompt = whale_analytics.build_assistant_prompt(prompt, data_df, context_view)
 
     try:
         response = model.generate_content(full_prompt)
@@ -165,11 +112,7 @@ def get_gemini_response(prompt, data_df, context_view):
 @st.cache_data
 def load_data():
     try:
-        top10_whales_df = pd.read_excel("data/top10_sui_whale.xlsx")
-        top1_balance_df = pd.read_excel("data/top1_sui_final.xlsx", header=1)
-        whales_usdt_df = pd.read_excel("data/whales_usdt.xlsx", header=1)
-        top1_transactions_df = pd.read_excel("data/whale_sui_top1_sui_transactions.xlsx", header=1)
-        return top10_whales_df, top1_balance_df, whales_usdt_df, top1_transactions_df
+        return whale_analytics.load_datasets()
     except FileNotFoundError as e:
         st.error(f"錯誤：找不到必要的 Excel 檔案 - {e}。")
         return None, None, None, None
@@ -193,35 +136,81 @@ def generate_demo_transaction_details():
 @st.cache_data
 def generate_fund_flow_data():
     """生成 SUI 資金流向的模擬數據"""
-    data = [
-        {'source': 'Top 1 Whale Wallet', 'target': 'Binance CEX', 'value': 1200000, 'label': '轉至交易所'},
-        {'source': 'Top 1 Whale Wallet', 'target': 'Scallop Finance', 'value': 850000, 'label': 'DeFi 質押'},
-        {'source': 'Top 1 Whale Wallet', 'target': 'Cetus Exchange', 'value': 650000, 'label': '提供流動性'},
-        {'source': 'Top 1 Whale Wallet', 'target': 'Other Wallets', 'value': 300000, 'label': '內部轉帳'},
-        {'source': 'Binance CEX', 'target': 'Top 1 Whale Wallet', 'value': 400000, 'label': '從交易所提幣'},
-        {'source': 'Scallop Finance', 'target': 'Top 1 Whale Wallet', 'value': 150000, 'label': '領取質押獎勵'},
-    ]
-    return pd.DataFrame(data)
+    return whale_analytics.fund_flows()
 
 # 新增生成投資組合模擬數據的函數
 @st.cache_data
 def generate_portfolio_data():
     """生成單一地址的投資組合模擬數據"""
-    data = {
-        'category': [
-            '錢包餘額', '錢包餘額', '已質押資產', '已質押資產', '借貸市場存款', '流動性池代幣'
-        ],
-        'protocol': [
-            'SUI', 'USDC', 'Scallop Finance', 'Cetus Exchange', 'Navi Protocol', 'Cetus (SUI-USDC)'
-        ],
-        'asset': [
-            'SUI', 'USDC', 'SUI', 'CETUS', 'USDC', 'SUI-USDC-LP'
-        ],
-        'value_usd': [
-            5000000, 1500000, 3500000, 500000, 2000000, 1200000
-        ]
-    }
-    return pd.DataFrame(data)
+    return whale_analytics.portfolio()
+
+# NEW: 建立 Top 10 鯨魚的「地址 × 日期」餘額矩陣 (磁碟快取為壓縮 .npz)
+@st.cache_data
+def load_cohort_matrix(top10_whales, top1_balance):
+    """以每日餘額數據建立群體餘額矩陣；目前僅 Top 1 鯨魚有每日餘額。"""
+    return whale_cohort.load_top10_matrix(top10_whales, top1_balance)
+
+# NEW: 以保存的偵測器狀態增量更新群體異常偵測 (只處理上次之後新增的日子)
+@st.cache_data
+def load_cohort_anomalies(top10_whales, top1_balance):
+    return whale_anomaly.update_cohort_anomalies(load_cohort_matrix(top10_whales, top1_balance))
+
+# NEW: 匯入交易時預先彙總每日 Gas 費用直方圖 (磁碟快取為壓縮 .npz)
+@st.cache_data
+def load_gas_histograms(top1_transactions):
+    return whale_gas.load_or_build_histograms(top1_transactions, source_paths=[whale_analytics.TOP1_TRANSACTIONS_PATH])
+
+# NEW: 讀取最近一次排名快照的名次變化 (以檔案修改時間作為快取鍵)
+@st.cache_data
+def load_rank_movements(history_mtime):
+    return whale_rank_history.latest_movements(whale_rank_history.load_history())
+
+@st.cache_data
+def load_rank_history(history_mtime):
+    return whale_rank_history.load_history()
+
+def format_rank_movement(whale_address, movements):
+    """將名次變化轉換成鯨魚卡片上的箭頭標記。"""
+    if whale_address not in movements:
+        return ""
+    change = movements[whale_address]
+    if change is None:
+        return " :blue[🆕 新進榜]"
+    if change > 0:
+        return f" :green[▲ {change}]"
+    return f" :red[▼ {-change}]"
+
+# NEW: 共用的匯出控制項，以批次串流的方式產生 CSV / Parquet 下載檔
+def render_export_controls(key, base_name, make_batches, make_schema=None):
+    """
+    顯示格式與壓縮方式的選單，按下按鈕後才向查詢引擎逐批取數據並寫成下載檔。
+
+    make_batches 為回傳 DataFrame 批次迭代器的函數；make_schema 回傳來源數據的 Parquet schema
+    (只在匯出 Parquet 時呼叫)。批次直接寫入暫存檔 (超過 8 MB 時落地到磁碟)，不會在記憶體中組出完整結果。
+    """
+    fmt_col, comp_col, btn_col = st.columns([1, 1, 1])
+    fmt = fmt_col.selectbox("格式", whale_export.EXPORT_FORMATS, key=f"{key}_format")
+    compressions = whale_export.CSV_COMPRESSIONS if fmt == 'csv' else whale_export.PARQUET_COMPRESSIONS
+    compression = comp_col.selectbox("壓縮", compressions, key=f"{key}_compression")
+    with btn_col:
+        st.write("")
+        prepare = st.button("產生匯出檔", key=f"{key}_prepare", use_container_width=True)
+    if prepare:
+        try:
+            with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as buffer:
+                schema = make_schema() if make_schema is not None and fmt == 'parquet' else None
+                count = whale_export.export_batches(make_batches(), buffer, fmt, compression, schema)
+                buffer.seek(0)
+                st.download_button(
+                    f"⬇️ 下載 ({count:,} 筆)",
+                    data=buffer.read(),
+                    file_name=whale_export.export_file_name(base_name, fmt, compression),
+                    mime=whale_export.export_mime_type(fmt, compression),
+                    key=f"{key}_download",
+                    use_container_width=True
+                )
+        except Exception as e:
+            st.error(f"匯出時發生錯誤：{e}")
 
 # --- 狀態管理 ---
 def init_session_state():
@@ -283,6 +272,9 @@ def render_sidebar():
             if st.button("穩定幣鯨魚列表", use_container_width=True):
                 navigate_to('穩定幣鯨魚')
                 st.rerun()
+            if st.button("鯨魚群體分析", use_container_width=True):
+                navigate_to('群體分析')
+                st.rerun()
 
         with st.expander("📊 項目監控", expanded=True):
             if st.button("Scallop", use_container_width=True):
@@ -321,13 +313,19 @@ def render_main_page(top10_whales, top1_transactions):
     st.header("SUI 持有量 Top 10 鯨魚")
     st.write("點擊鯨魚卡片旁的「查看詳情」按鈕，分析其每日 SUI 持有量變化。")
     if top10_whales is not None:
+        with st.expander("⬇️ 匯出鯨魚列表"):
+            render_export_controls("export_top10", "top10_sui_whale",
+                                   lambda: whale_export.iter_dataframe_batches(top10_whales),
+                                   lambda: whale_export.frame_schema(top10_whales))
+        history_path = Path(whale_rank_history.DEFAULT_HISTORY_PATH)
+        movements = load_rank_movements(history_path.stat().st_mtime_ns) if history_path.is_file() else {}
         for index, row in top10_whales.iterrows():
             with st.container(border=True):
                 whale_address = row.iloc[0]
                 total_sui = float(row.iloc[1])
                 col_info, col_btn = st.columns([4, 1])
                 with col_info:
-                    st.markdown(f"#### **排名 {index + 1}**")
+                    st.markdown(f"#### **排名 {index + 1}**{format_rank_movement(str(whale_address), movements)}")
                     st.markdown(f"**地址**: `{whale_address}`")
                     st.metric(label="持有量 (SUI)", value=f"{total_sui:,.2f}")
                 with col_btn:
@@ -343,10 +341,11 @@ def render_main_page(top10_whales, top1_transactions):
                     st.markdown("##### 最近 5 筆交易活動 (Demo)")
                     top1_transactions['timestamp_ms'] = pd.to_numeric(top1_transactions['timestamp_ms'], errors='coerce')
                     latest_txs = top1_transactions.dropna(subset=['timestamp_ms']).sort_values('timestamp_ms', ascending=False).head(5)
+                    # Gas 費用一次向量化換算成 SUI，不在迴圈中逐列轉換
+                    gas_costs = pd.to_numeric(latest_txs.get('total_gas_cost', pd.Series(0, index=latest_txs.index)), errors='coerce').fillna(0) / whale_analytics.MIST_PER_SUI
                     display_txs = []
-                    for _, tx_row in latest_txs.iterrows():
+                    for (_, tx_row), gas_cost in zip(latest_txs.iterrows(), gas_costs):
                         tx_time = datetime.fromtimestamp(tx_row['timestamp_ms'] / 1000).strftime('%Y-%m-%d %H:%M:%S')
-                        gas_cost = (pd.to_numeric(tx_row.get('total_gas_cost', 0), errors='coerce') or 0) / 1e9
                         demo_details = generate_demo_transaction_details()
                         display_txs.append({
                             "時間": tx_time, "類型": demo_details["類型"], "協議/對象": demo_details["協議/對象"],
@@ -365,8 +364,44 @@ def render_main_page(top10_whales, top1_transactions):
     else:
         st.error("無法載入 `data/top10_sui_whale.xlsx`，請檢查檔案是否存在。")
 
+# NEW: Gas 費用分析區塊，查詢時只合併預先彙總的每日直方圖，不掃描原始交易
+def render_gas_analysis(histograms, key, addresses=None, by='kind'):
+    scope = whale_gas.select_groups(histograms, addresses=addresses)
+    if not scope.any():
+        st.info("沒有可分析的交易紀錄。")
+        return
+    scope_dates = pd.to_datetime(histograms['dates'][scope])
+    date_range = st.date_input("日期範圍", value=(scope_dates.min().date(), scope_dates.max().date()), key=f"{key}_range")
+    if not (isinstance(date_range, (list, tuple)) and len(date_range) == 2):
+        st.info("請選擇完整的起訖日期。")
+        return
+    filters = {'start_date': date_range[0], 'end_date': date_range[1], 'addresses': addresses}
+
+    summary = whale_gas.gas_summary(histograms, by=by, **filters)
+    if summary.empty:
+        st.info("所選範圍內沒有交易。")
+        return
+    st.markdown("##### 各交易類型的 Gas 費用分佈 (單位: SUI)" if by == 'kind' else "##### 各鯨魚的 Gas 費用分佈 (單位: SUI)")
+    st.dataframe(summary, use_container_width=True, hide_index=True,
+                 column_config={"group": "交易類型" if by == 'kind' else "地址", "transactions": "交易數",
+                                **{col: st.column_config.NumberColumn(format="%.6f") for col in summary.columns if col.endswith('_sui')}})
+
+    daily = whale_gas.daily_percentiles(histograms, **filters)
+    fig = px.line(daily, x='date', y=[col for col in daily.columns if col.endswith('_sui')],
+                  title='每日 Gas 費用百分位數 (SUI)')
+    st.plotly_chart(fig, use_container_width=True)
+
+    # 合併後的直方圖 (只顯示有交易的分箱)
+    merged = histograms['counts'][whale_gas.select_groups(histograms, **filters)].sum(axis=0)
+    nonzero = merged.nonzero()[0]
+    hist_df = pd.DataFrame({
+        'gas_sui': (whale_gas.BIN_EDGES[nonzero] + whale_gas.BIN_EDGES[nonzero + 1]) / 2 / whale_analytics.MIST_PER_SUI,
+        'transactions': merged[nonzero],
+    })
+    st.plotly_chart(px.bar(hist_df, x='gas_sui', y='transactions', title='Gas 費用分佈 (SUI)'), use_container_width=True)
+
 # MODIFIED: 在詳細資訊頁加入資金流向追蹤功能
-def render_detail_page(top1_balance, top1_transactions):
+def render_detail_page(top10_whales, top1_balance, top1_transactions):
     main_col, ai_col = st.columns([2, 1])
     with main_col:
         with st.container(border=True):
@@ -374,7 +409,7 @@ def render_detail_page(top1_balance, top1_transactions):
             st.markdown(f"**地址**: `{st.session_state.selected_whale}`")
             
             # MODIFIED: 調整欄位以容納新按鈕
-            btn_col1, btn_col2, btn_col3, btn_col4, btn_col5 = st.columns([1, 1.2, 1.2, 1.5, 1.5])
+            btn_col1, btn_col2, btn_col3, btn_col4, btn_col5, btn_col6 = st.columns([1, 1.2, 1.2, 1.5, 1.5, 1.3])
             with btn_col1:
                 if st.button("← 返回", use_container_width=True): # 簡化按鈕文字
                     navigate_to('主頁')
@@ -399,21 +434,64 @@ def render_detail_page(top1_balance, top1_transactions):
                 if st.button("💰 投資組合", use_container_width=True, type=btn_type): # 簡化按鈕文字
                     st.session_state.detail_view = '投資組合分析'
                     st.rerun()
+            # NEW: 新增 Gas 費用分析按鈕
+            with btn_col6:
+                btn_type = "primary" if st.session_state.detail_view == 'Gas分析' else "secondary"
+                if st.button("⛽ Gas 費用", use_container_width=True, type=btn_type):
+                    st.session_state.detail_view = 'Gas分析'
+                    st.rerun()
 
             if st.session_state.detail_view == '圖表分析':
                 if top1_balance is not None and not top1_balance.empty:
-                    df_sui = top1_balance.copy()
-                    df_sui['net_sui_change_sui'] = pd.to_numeric(df_sui['net_sui_change'], errors='coerce') / 1_000_000_000
-                    df_sui['balance_at_end_of_day_sui'] = pd.to_numeric(df_sui['balance_at_end_of_day'], errors='coerce') / 1_000_000_000
+                    df_sui = whale_analytics.balance_series(top1_balance)
                     st.subheader("每日 SUI 總餘額變化 (單位: SUI)")
                     fig1 = px.line(df_sui, x='transaction_date', y='balance_at_end_of_day_sui', title='鯨魚 SUI 持有量歷史趨勢')
                     st.plotly_chart(fig1, use_container_width=True)
                     st.subheader("每日 SUI 淨流入/流出 (單位: SUI)")
                     fig2 = px.bar(df_sui, x='transaction_date', y='net_sui_change_sui', title='鯨魚每日 SUI 淨變化')
+
+                    # NEW: 以滾動 z-score 標記異常日，並以 CUSUM 標記變點 (取群體偵測結果中 Top 1 鯨魚的部分)
+                    flagged = pd.DataFrame(columns=['date', 'net_sui_change_sui', 'zscore', 'is_anomaly', 'change_point'])
+                    if top10_whales is not None:
+                        cohort_anomalies = whale_anomaly.anomalies_table(load_cohort_anomalies(top10_whales, top1_balance))
+                        flagged = cohort_anomalies[cohort_anomalies['owner_address'] == str(top10_whales.iloc[0, 0])]
+                    anomalies = flagged[flagged['is_anomaly']]
+                    change_points = flagged[flagged['change_point']]
+                    fig2.add_trace(go.Scatter(
+                        x=anomalies['date'], y=anomalies['net_sui_change_sui'],
+                        mode='markers', name=f'異常日 (|z| ≥ {whale_anomaly.DEFAULT_Z_THRESHOLD:g})',
+                        marker=dict(color='red', size=10, symbol='x'),
+                        customdata=anomalies['zscore'], hovertemplate='%{x}<br>%{y:,.2f} SUI<br>z = %{customdata:.2f}'
+                    ))
+                    fig2.add_trace(go.Scatter(
+                        x=change_points['date'], y=change_points['net_sui_change_sui'],
+                        mode='markers', name='變點 (CUSUM)',
+                        marker=dict(color='orange', size=11, symbol='diamond-open', line=dict(width=2))
+                    ))
                     st.plotly_chart(fig2, use_container_width=True)
+                    st.caption(f"異常日以過去 {whale_anomaly.DEFAULT_WINDOW} 天的滾動平均與標準差計算 z-score；"
+                               f"共標記 {len(anomalies)} 個異常日與 {len(change_points)} 個變點。")
                 else:
                     st.error("無法載入 `data/top1_sui_final.xlsx` 圖表數據。")
 
+                # NEW: 所選鯨魚在歷次持有者快照中的排名與進榜/出榜紀錄
+                history_path = Path(whale_rank_history.DEFAULT_HISTORY_PATH)
+                if history_path.is_file():
+                    history = load_rank_history(history_path.stat().st_mtime_ns)
+                    address = str(st.session_state.selected_whale)
+                    st.subheader("🏅 排名歷史")
+                    ranks = whale_rank_history.rank_over_time(history, address)
+                    if ranks.empty:
+                        st.info("此地址尚未出現在任何排名快照中。")
+                    else:
+                        fig_rank = px.line(ranks, x='snapshot_date', y='rank', markers=True, title='持有量排名變化')
+                        fig_rank.update_yaxes(autorange='reversed')
+                        st.plotly_chart(fig_rank, use_container_width=True)
+                    events = whale_rank_history.events_table(history)
+                    events = events[events['owner_address'] == address]
+                    if not events.empty:
+                        st.dataframe(events.drop(columns='owner_address'), use_container_width=True, hide_index=True)
+
             elif st.session_state.detail_view == 'SQL查詢':
                 st.subheader("📄 原始交易數據預覽 (前 10 筆)")
                 if top1_transactions is not None and not top1_transactions.empty:
@@ -433,8 +511,7 @@ def render_detail_page(top1_balance, top1_transactions):
                     if st.button("執行查詢", use_container_width=True, type="primary"):
                         if top1_transactions is not None:
                             try:
-                                from pandasql import sqldf
-                                result_df = sqldf(query, {'top1_transactions': top1_transactions})
+                                result_df = whale_analytics.run_sql(query, top1_transactions)
                                 st.subheader("✅ 查詢結果")
                                 st.dataframe(result_df, use_container_width=True)
                             except Exception as e:
@@ -461,6 +538,32 @@ def render_detail_page(top1_balance, top1_transactions):
                                 st.warning("查詢內容不能為空。")
                     else:
                         st.button("💾 儲存查詢", use_container_width=True, disabled=True, help="請先登入才能儲存")
+
+                if top1_transactions is not None:
+                    st.markdown("---")
+                    st.subheader("⬇️ 匯出查詢結果")
+                    st.caption("以上方的 SQL 查詢逐批產生檔案，適合匯出大量結果。")
+                    render_export_controls(
+                        "export_sql", "query_result",
+                        lambda: whale_export.iter_query_batches(query, {'top1_transactions': top1_transactions})
+                    )
+
+                    st.subheader("⬇️ 依時間範圍匯出交易")
+                    tx_times = pd.to_datetime(pd.to_numeric(top1_transactions['timestamp_ms'], errors='coerce'), unit='ms').dropna()
+                    if not tx_times.empty:
+                        date_range = st.date_input(
+                            "交易日期範圍",
+                            value=(tx_times.min().date(), tx_times.max().date()),
+                            key="export_tx_range"
+                        )
+                        if isinstance(date_range, (list, tuple)) and len(date_range) == 2:
+                            start_ms = int(pd.Timestamp(date_range[0]).timestamp() * 1000)
+                            end_ms = int((pd.Timestamp(date_range[1]) + pd.Timedelta(days=1)).timestamp() * 1000) - 1
+                            render_export_controls(
+                                "export_tx", f"top1_transactions_{date_range[0]}_{date_range[1]}",
+                                lambda: whale_export.iter_transaction_batches(top1_transactions, start_ms, end_ms),
+                                lambda: whale_export.transaction_schema(top1_transactions)
+                            )
             
             elif st.session_state.detail_view == '資金流向追蹤':
                 st.subheader("🌊 資金流向分析 (最近 7 天模擬數據)")
@@ -529,6 +632,14 @@ def render_detail_page(top1_balance, top1_transactions):
                     }
                 )
 
+            elif st.session_state.detail_view == 'Gas分析':
+                st.subheader("⛽ Gas 費用分析")
+                if top1_transactions is not None and not top1_transactions.empty:
+                    render_gas_analysis(load_gas_histograms(top1_transactions), "detail_gas",
+                                        addresses=[st.session_state.selected_whale])
+                else:
+                    st.warning("交易數據無法載入。")
+
     # AI 助理部分保持不變
     with ai_col:
         if st.session_state.show_ai_assistant:
@@ -574,9 +685,67 @@ def render_stablecoin_page(whales_usdt):
     st.header("💵 穩定幣鯨魚持有量列表")
     if whales_usdt is not None:
         st.dataframe(whales_usdt, use_container_width=True, hide_index=True)
+        with st.expander("⬇️ 匯出鯨魚列表"):
+            render_export_controls("export_usdt", "whales_usdt",
+                                   lambda: whale_export.iter_dataframe_batches(whales_usdt),
+                                   lambda: whale_export.frame_schema(whales_usdt))
     else:
         st.info("USDT 數據未載入。")
 
+# NEW: 鯨魚群體分析頁面
+def render_cohort_page(top10_whales, top1_balance, top1_transactions):
+    st.header("🐋 Top 10 鯨魚群體分析")
+    if top10_whales is None or top1_balance is None or top1_balance.empty:
+        st.error("無法載入鯨魚列表或每日餘額數據。")
+        return
+
+    matrix = load_cohort_matrix(top10_whales, top1_balance)
+    dense = whale_cohort.to_dense(matrix) / whale_analytics.MIST_PER_SUI
+    dates = pd.to_datetime(matrix['dates'])
+    short_names = [f"{address[:6]}...{address[-4:]}" for address in matrix['addresses']]
+    tracked = int((~np.isnan(dense).all(axis=1)).sum())
+    st.caption(f"群體共 {len(matrix['addresses'])} 個地址，其中 {tracked} 個有每日餘額數據。")
+
+    # 目前持有量的集中度 (以 Top 10 快照計算)
+    snapshot = pd.to_numeric(top10_whales.iloc[:, 1], errors='coerce').to_numpy()
+    gini, hhi = whale_cohort.concentration_metrics(snapshot)
+    col1, col2 = st.columns(2)
+    col1.metric("Gini 係數 (Top 10 快照)", f"{gini:.3f}")
+    col2.metric("HHI (Top 10 快照)", f"{hhi:.3f}")
+
+    st.subheader("群體每日 SUI 淨流入/流出 (單位: SUI)")
+    flow_df = pd.DataFrame({'date': dates, 'net_flow_sui': whale_cohort.cohort_net_flow(dense)})
+    st.plotly_chart(px.bar(flow_df, x='date', y='net_flow_sui', title='群體每日 SUI 淨變化'), use_container_width=True)
+
+    st.subheader("每日持有量集中度")
+    daily_gini, daily_hhi = whale_cohort.concentration_metrics(dense)
+    if np.isnan(daily_gini).all():
+        # 只以當天有每日餘額的地址計算，少於 2 個地址時集中度沒有意義
+        st.info("有每日餘額數據的地址少於 2 個，無法計算逐日集中度。")
+    else:
+        conc_df = pd.DataFrame({'date': dates, 'Gini': daily_gini, 'HHI': daily_hhi})
+        st.plotly_chart(px.line(conc_df, x='date', y=['Gini', 'HHI'], title='群體集中度趨勢'), use_container_width=True)
+
+    st.subheader("群體異常日與變點")
+    cohort_anomalies = whale_anomaly.anomalies_table(load_cohort_anomalies(top10_whales, top1_balance))
+    if cohort_anomalies.empty:
+        st.info("目前沒有偵測到異常日或變點。")
+    else:
+        st.dataframe(cohort_anomalies, use_container_width=True, hide_index=True,
+                     column_config={'net_sui_change_sui': st.column_config.NumberColumn(format="%.2f"),
+                                    'zscore': st.column_config.NumberColumn(format="%.2f")})
+
+    st.subheader("鯨魚每日餘額變化相關性")
+    corr = whale_cohort.whale_correlation(dense)
+    fig = px.imshow(corr, x=short_names, y=short_names, zmin=-1, zmax=1,
+                    color_continuous_scale='RdBu', title='每日餘額變化相關係數')
+    st.plotly_chart(fig, use_container_width=True)
+
+    if top1_transactions is not None and not top1_transactions.empty:
+        st.subheader("⛽ 群體 Gas 費用")
+        render_gas_analysis(load_gas_histograms(top1_transactions), "cohort_gas",
+                            addresses=matrix['addresses'].tolist(), by='address')
+
 # NEW: 全新的個人檔案頁面渲染函數
 def render_profile_page():
     st.header(f"👤 {st.session_state.user['name']} 的個人檔案")
@@ -669,13 +838,15 @@ def main():
     if page == '主頁':
         # MODIFIED: 如果有選擇的鯨魚，則跳轉到詳細頁面，否則顯示列表
         if st.session_state.selected_whale:
-             render_detail_page(top1_balance, top1_transactions)
+             render_detail_page(top10_whales, top1_balance, top1_transactions)
         else:
              render_main_page(top10_whales, top1_transactions)
     elif page == '詳細資訊':
-        render_detail_page(top1_balance, top1_transactions)
+        render_detail_page(top10_whales, top1_balance, top1_transactions)
     elif page == '穩定幣鯨魚':
         render_stablecoin_page(whales_usdt)
+    elif page == '群體分析':
+        render_cohort_page(top10_whales, top1_balance, top1_transactions)
     elif page == '個人檔案':
         if st.session_state.user['logged_in']:
             render_profile_page()
@@ -0,0 +1,199 @@
+import pandas as pd
+
+import select_top10_sui_whale
+import whale_export
+
+# 鏈上餘額單位為 MIST，1 SUI = 10^9 MIST
+MIST_PER_SUI = 1_000_000_000
+
+# 儀表板使用的數據檔案
+TOP10_WHALES_PATH = "data/top10_sui_whale.xlsx"
+WHALE_HOLDERS_PATH = "data/whale_sui.xlsx"
+TOP1_BALANCE_PATH = "data/top1_sui_final.xlsx"
+WHALES_USDT_PATH = "data/whales_usdt.xlsx"
+TOP1_TRANSACTIONS_PATH = "data/whale_sui_top1_sui_transactions.xlsx"
+
+# SQL 查詢工作區中交易數據的表格名稱
+TRANSACTIONS_TABLE = "top1_transactions"
+
+
+def load_datasets():
+    """
+    讀取儀表板所需的所有 Excel 數據。
+
+    Returns:
+        tuple: (top10_whales, top1_balance, whales_usdt, top1_transactions) 四個 DataFrame。
+
+    Raises:
+        FileNotFoundError: 找不到任一數據檔案時。
+    """
+    top10_whales_df = pd.read_excel(TOP10_WHALES_PATH)
+    top1_balance_df = pd.read_excel(TOP1_BALANCE_PATH, header=1)
+    whales_usdt_df = pd.read_excel(WHALES_USDT_PATH, header=1)
+    top1_transactions_df = pd.read_excel(TOP1_TRANSACTIONS_PATH, header=1)
+    return top10_whales_df, top1_balance_df, whales_usdt_df, top1_transactions_df
+
+
+def top_n_whales(n=10, file_path=WHALE_HOLDERS_PATH):
+    """
+    從持有者列表中選出持有量最大的前 N 名鯨魚。
+
+    Returns:
+        pandas.DataFrame: 前 N 名鯨魚 (含 'owner_address'、'total_sui' 欄位)，讀取失敗時回傳 None。
+    """
+    holders_df = select_top10_sui_whale.load_whale_holders(file_path)
+    if holders_df is None:
+        return None
+    return holders_df.head(n).reset_index(drop=True)
+
+
+def balance_series(balance_df):
+    """
+    將每日餘額數據的 MIST 欄位換算成 SUI。
+
+    Args:
+        balance_df (pandas.DataFrame): 需包含 'transaction_date'、'net_sui_change'、'balance_at_end_of_day'。
+
+    Returns:
+        pandas.DataFrame: 新增 'net_sui_change_sui' 與 'balance_at_end_of_day_sui' 欄位的副本。
+    """
+    df_sui = balance_df.copy()
+    df_sui['net_sui_change_sui'] = pd.to_numeric(df_sui['net_sui_change'], errors='coerce') / MIST_PER_SUI
+    df_sui['balance_at_end_of_day_sui'] = pd.to_numeric(df_sui['balance_at_end_of_day'], errors='coerce') / MIST_PER_SUI
+    return df_sui
+
+
+def run_sql(query, transactions, max_rows=None):
+    """
+    以 SQLite 語法查詢交易數據 (表格名稱為 `top1_transactions`)。
+
+    Args:
+        query (str): SQL 查詢語句。
+        transactions (pandas.DataFrame | sqlite3.Connection): 交易數據，或已載入表格的連線。
+        max_rows (int, optional): 最多回傳的列數，避免意外取回過大的結果。
+
+    Returns:
+        pandas.DataFrame: 查詢結果。
+    """
+    tables = transactions if not isinstance(transactions, pd.DataFrame) else {TRANSACTIONS_TABLE: transactions}
+    batches = []
+    rows = 0
+    for batch in whale_export.iter_query_batches(query, tables):
+        if max_rows is not None and rows + len(batch) > max_rows:
+            batches.append(batch.iloc[:max_rows - rows])
+            break
+        batches.append(batch)
+        rows += len(batch)
+    return pd.concat(batches, ignore_index=True)
+
+
+def fund_flows():
+    """生成 SUI 資金流向的模擬數據"""
+    data = [
+        {'source': 'Top 1 Whale Wallet', 'target': 'Binance CEX', 'value': 1200000, 'label': '轉至交易所'},
+        {'source': 'Top 1 Whale Wallet', 'target': 'Scallop Finance', 'value': 850000, 'label': 'DeFi 質押'},
+        {'source': 'Top 1 Whale Wallet', 'target': 'Cetus Exchange', 'value': 650000, 'label': '提供流動性'},
+        {'source': 'Top 1 Whale Wallet', 'target': 'Other Wallets', 'value': 300000, 'label': '內部轉帳'},
+        {'source': 'Binance CEX', 'target': 'Top 1 Whale Wallet', 'value': 400000, 'label': '從交易所提幣'},
+        {'source': 'Scallop Finance', 'target': 'Top 1 Whale Wallet', 'value': 150000, 'label': '領取質押獎勵'},
+    ]
+    return pd.DataFrame(data)
+
+
+def fund_flow_totals(flow_df):
+    """
+    彙總每個節點的資金流入、流出與淨額。
+
+    Returns:
+        pandas.DataFrame: 欄位為 'node'、'inflow'、'outflow'、'net'，依淨額排序。
+    """
+    inflow = flow_df.groupby('target')['value'].sum()
+    outflow = flow_df.groupby('source')['value'].sum()
+    totals = pd.DataFrame({'inflow': inflow, 'outflow': outflow}).fillna(0)
+    totals['net'] = totals['inflow'] - totals['outflow']
+    totals.index.name = 'node'
+    return totals.reset_index().sort_values('net', ascending=False, ignore_index=True)
+
+
+def portfolio():
+    """生成單一地址的投資組合模擬數據"""
+    data = {
+        'category': [
+            '錢包餘額', '錢包餘額', '已質押資產', '已質押資產', '借貸市場存款', '流動性池代幣'
+        ],
+        'protocol': [
+            'SUI', 'USDC', 'Scallop Finance', 'Cetus Exchange', 'Navi Protocol', 'Cetus (SUI-USDC)'
+        ],
+        'asset': [
+            'SUI', 'USDC', 'SUI', 'CETUS', 'USDC', 'SUI-USDC-LP'
+        ],
+        'value_usd': [
+            5000000, 1500000, 3500000, 500000, 2000000, 1200000
+        ]
+    }
+    return pd.DataFrame(data)
+
+
+def build_assistant_prompt(prompt, data_df, context_view):
+    """根據使用者當前的視圖，組出傳給 AI 助理的完整提示詞。"""
+    base_prompt = """
+    你是一位專業、友善的加密貨幣數據分析助理。你的職責是根據使用者當前的操作頁面，提供對應的幫助。
+    """
+
+    context_prompt = ""
+    # 根據視圖提供不同的上下文和指示
+    if context_view == '圖表分析':
+        if data_df is not None and not data_df.empty:
+            data_context = data_df.to_csv(index=False)
+            context_prompt = f"""
+            使用者正在查看 SUI 鯨魚的每日持有量變化圖表。請根據以下的數據 CSV，回答他的問題，並提供簡潔、專業的見解。
+
+            --- 圖表數據 ---
+            {data_context}
+            --- 數據結束 ---
+            """
+    elif context_view == 'SQL查詢':
+        if data_df is not None and not data_df.empty:
+            data_context = ", ".join(data_df.columns)
+            context_prompt = f"""
+            使用者正在 SQL 查詢工作區，希望能查詢名為 `top1_transactions` 的表格。
+            - 如果使用者想知道如何查詢，請幫他生成一段符合需求的 SQL 程式碼。
+            - 如果使用者詢問欄位意義，請根據欄位名稱進行解釋 (例如 `transaction_digest` 是交易哈希值)。
+            - **絕對不要**自己執行查詢，僅提供 SQL 程式碼或解釋。
+
+            可用的欄位如下:
+            `{data_context}`
+            """
+    elif context_view == '資金流向追蹤':
+        if data_df is not None and not data_df.empty:
+            data_context = data_df.to_csv(index=False)
+            context_prompt = f"""
+            使用者正在查看 Top 1 鯨魚的資金流向追蹤圖表。請根據以下的數據 CSV，回答他的問題或提供見解，例如分析哪個協議是該鯨魚最主要的資金去向。
+
+            --- 圖表數據 ---
+            {data_context}
+            --- 數據結束 ---
+            """
+
+    elif context_view == '投資組合分析':
+        if data_df is not None and not data_df.empty:
+            data_context = data_df.to_csv(index=False)
+            context_prompt = f"""
+            使用者正在查看 Top 1 鯨魚的資產投資組合分佈。請根據以下的數據 CSV，回答他的問題或提供見解，例如分析該鯨魚的資產主要集中在哪種類型的投資，以及哪個協議佔比最高。
+
+            --- 投資組合數據 ---
+            {data_context}
+            --- 數據結束 ---
+            """
+
+    full_prompt = f"""
+    {base_prompt}
+    {context_prompt}
+
+    使用者的問題是：
+    "{prompt}"
+
+    請用繁體中文回答。
+    """
+
+    return full_prompt
@@ -0,0 +1,277 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import whale_analytics
+import whale_cohort
+
+# 偵測器狀態與歷史結果的保存位置 (與群體矩陣快取放在一起)
+DEFAULT_STATE_PATH = "data/cache/anomaly_detector.npz"
+
+# 預設的滾動視窗長度 (天) 與判定門檻
+DEFAULT_WINDOW = 30
+DEFAULT_MIN_PERIODS = 7
+DEFAULT_Z_THRESHOLD = 3.0
+
+# CUSUM 變點偵測參數 (以 z-score 為單位)：容許偏移 k 與觸發門檻 h
+DEFAULT_CUSUM_DRIFT = 0.5
+DEFAULT_CUSUM_THRESHOLD = 5.0
+
+_STATE_KEYS = ('buffer', 'position', 'count', 'total', 'total_sq', 'cusum_pos', 'cusum_neg', 'updates')
+_HISTORY_KEYS = ('addresses', 'dates', 'changes', 'zscore', 'is_anomaly', 'change_point')
+
+
+class RollingAnomalyDetector:
+    """
+    以串流方式偵測每日淨變化的異常值，一次處理所有追蹤中的鯨魚。
+
+    每位鯨魚維護一個固定長度的環狀緩衝區，以及視窗內的累計和與平方和，
+    因此每新增一天只需 O(1) 的運算即可更新滾動平均、標準差與 z-score，
+    不必重新計算整段歷史。變點偵測採用雙向 CUSUM。
+    """
+
+    def __init__(self, n_whales, window=DEFAULT_WINDOW, min_periods=DEFAULT_MIN_PERIODS,
+                 z_threshold=DEFAULT_Z_THRESHOLD, cusum_drift=DEFAULT_CUSUM_DRIFT,
+                 cusum_threshold=DEFAULT_CUSUM_THRESHOLD):
+        if window < 1:
+            raise ValueError(f"滾動視窗長度必須至少為 1 天：{window}")
+        self.window = window
+        self.min_periods = min(min_periods, window)
+        self.z_threshold = z_threshold
+        self.cusum_drift = cusum_drift
+        self.cusum_threshold = cusum_threshold
+
+        self.buffer = np.zeros((n_whales, window))
+        self.position = np.zeros(n_whales, dtype=np.int64)
+        self.count = np.zeros(n_whales, dtype=np.int64)
+        self.total = np.zeros(n_whales)
+        self.total_sq = np.zeros(n_whales)
+        self.cusum_pos = np.zeros(n_whales)
+        self.cusum_neg = np.zeros(n_whales)
+        self.updates = np.zeros(n_whales, dtype=np.int64)
+
+    def update(self, values):
+        """
+        加入新一天的數值 (每位鯨魚一個)，並回傳當天的偵測結果。
+
+        z-score 以「加入當天之前」的視窗計算，避免異常值稀釋自己的分數。
+        值為 NaN 的鯨魚視為當天沒有數據，狀態維持不變。
+
+        Args:
+            values (numpy.ndarray): 形狀為 (鯨魚數,) 的當日數值。
+
+        Returns:
+            dict: 'zscore'、'is_anomaly'、'change_point' 三個形狀為 (鯨魚數,) 的陣列。
+        """
+        values = np.asarray(values, dtype=np.float64)
+        has_value = ~np.isnan(values)
+        filled = np.where(has_value, values, 0.0)
+
+        # 以目前視窗 (不含今天) 計算 z-score
+        n = self.count
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = self.total / n
+            var = np.maximum(self.total_sq / n - mean * mean, 0.0)
+            std = np.sqrt(var)
+            zscore = np.where(std > 0, (filled - mean) / std, 0.0)
+        ready = has_value & (n >= self.min_periods)
+        zscore = np.where(ready, zscore, np.nan)
+        is_anomaly = ready & (np.abs(zscore) >= self.z_threshold)
+
+        # 雙向 CUSUM：累積超過容許偏移的 z-score，超過門檻即視為變點並歸零
+        z_for_cusum = np.where(ready, zscore, 0.0)
+        self.cusum_pos = np.where(ready, np.maximum(0.0, self.cusum_pos + z_for_cusum - self.cusum_drift), self.cusum_pos)
+        self.cusum_neg = np.where(ready, np.maximum(0.0, self.cusum_neg - z_for_cusum - self.cusum_drift), self.cusum_neg)
+        change_point = (self.cusum_pos > self.cusum_threshold) | (self.cusum_neg > self.cusum_threshold)
+        self.cusum_pos[change_point] = 0.0
+        self.cusum_neg[change_point] = 0.0
+
+        # 將今天的值放進環狀緩衝區，並扣掉被擠出視窗的舊值
+        rows = np.nonzero(has_value)[0]
+        slots = self.position[rows]
+        evicted = np.where(self.count[rows] >= self.window, self.buffer[rows, slots], 0.0)
+        self.total[rows] += filled[rows] - evicted
+        self.total_sq[rows] += filled[rows] ** 2 - evicted ** 2
+        self.buffer[rows, slots] = filled[rows]
+        self.position[rows] = (slots + 1) % self.window
+        self.count[rows] = np.minimum(self.count[rows] + 1, self.window)
+        self.updates[rows] += 1
+
+        # 累計和長期增減會累積浮點誤差，每滿一個視窗就從緩衝區重算一次 (攤提後仍為 O(1))
+        resync = rows[self.updates[rows] % self.window == 0]
+        if len(resync):
+            self.total[resync] = self.buffer[resync].sum(axis=1)
+            self.total_sq[resync] = np.square(self.buffer[resync]).sum(axis=1)
+
+        return {'zscore': zscore, 'is_anomaly': is_anomaly, 'change_point': change_point}
+
+    def params(self):
+        """回傳偵測參數，用來判斷保存的狀態是否能沿用。"""
+        return (self.window, self.min_periods, self.z_threshold, self.cusum_drift, self.cusum_threshold)
+
+    def save(self, path, **arrays):
+        """
+        將偵測器狀態寫入壓縮的 .npz 檔，供下次只處理新的一天。
+
+        Args:
+            path (str): 狀態檔案路徑。
+            **arrays: 與狀態一起保存的其他陣列 (例如已處理的日期與偵測結果)。
+        """
+        state_dir = os.path.dirname(path)
+        if state_dir and not os.path.exists(state_dir):
+            os.makedirs(state_dir)
+        state = {key: getattr(self, key) for key in _STATE_KEYS}
+        np.savez_compressed(path, params=np.array(self.params()), **state, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        從 .npz 檔還原偵測器。
+
+        Returns:
+            tuple: (detector, arrays)，arrays 為 save 時一併保存的其他陣列；
+                   檔案不存在或讀取失敗時回傳 (None, {})。
+        """
+        if not os.path.exists(path):
+            return None, {}
+        try:
+            with np.load(path, allow_pickle=False) as stored:
+                window, min_periods, z_threshold, cusum_drift, cusum_threshold = stored['params']
+                detector = cls(len(stored['count']), int(window), int(min_periods), float(z_threshold),
+                               float(cusum_drift), float(cusum_threshold))
+                for key in _STATE_KEYS:
+                    setattr(detector, key, stored[key])
+                arrays = {key: stored[key] for key in stored.files if key != 'params' and key not in _STATE_KEYS}
+            return detector, arrays
+        except Exception as e:
+            print(f"讀取異常偵測狀態時發生錯誤：{e}")
+            return None, {}
+
+
+def run_detector(detector, changes):
+    """
+    以既有的偵測器逐日處理新的數據 (每天 O(1)，所有鯨魚同時處理)。
+
+    Args:
+        detector (RollingAnomalyDetector): 要延續的偵測器，狀態會就地更新。
+        changes (numpy.ndarray): 形狀為 (鯨魚數, 天數) 的每日淨變化。
+
+    Returns:
+        tuple: (zscore, is_anomaly, change_point)，形狀與 changes 相同。
+    """
+    zscore = np.full(changes.shape, np.nan)
+    is_anomaly = np.zeros(changes.shape, dtype=bool)
+    change_point = np.zeros(changes.shape, dtype=bool)
+    for day in range(changes.shape[1]):
+        result = detector.update(changes[:, day])
+        zscore[:, day] = result['zscore']
+        is_anomaly[:, day] = result['is_anomaly']
+        change_point[:, day] = result['change_point']
+    return zscore, is_anomaly, change_point
+
+
+def detect_anomalies(changes, **detector_kwargs):
+    """
+    對整段歷史從頭執行串流偵測。
+
+    Args:
+        changes (numpy.ndarray): 形狀為 (鯨魚數, 天數) 的每日淨變化；一維時視為單一鯨魚。
+        **detector_kwargs: 傳給 RollingAnomalyDetector 的參數。
+
+    Returns:
+        tuple: (detector, zscore, is_anomaly, change_point)，後三者形狀與 changes 相同，
+               detector 可保存後用於之後的增量更新。
+    """
+    changes = np.atleast_2d(np.asarray(changes, dtype=np.float64))
+    detector = RollingAnomalyDetector(changes.shape[0], **detector_kwargs)
+    return (detector,) + run_detector(detector, changes)
+
+
+def cohort_daily_changes(matrix):
+    """
+    由群體餘額矩陣計算每位鯨魚的每日淨變化 (單位：SUI)。
+
+    只有實際觀測到餘額的日子才有值，其餘為 NaN，偵測器會略過這些日子。
+    """
+    dense = whale_cohort.to_dense(matrix)
+    changes = np.diff(dense, axis=1, prepend=np.full((dense.shape[0], 1), np.nan))
+    observed = np.zeros(dense.shape, dtype=bool)
+    observed[matrix['rows'], matrix['cols']] = True
+    changes[~observed] = np.nan
+    return changes / whale_analytics.MIST_PER_SUI
+
+
+def update_cohort_anomalies(matrix, state_path=DEFAULT_STATE_PATH, **detector_kwargs):
+    """
+    對群體內所有鯨魚增量更新異常偵測，並把偵測器狀態保存到磁碟。
+
+    上次保存的日期若是目前日期軸的開頭且數據未被改寫，只對之後新增的日子呼叫 update；
+    鯨魚名單、偵測參數或過去的數據不同時，才從頭重算整段歷史。
+
+    Args:
+        matrix (dict): whale_cohort.build_balance_matrix 的回傳值。
+        state_path (str): 偵測器狀態檔案路徑。
+        **detector_kwargs: 傳給 RollingAnomalyDetector 的參數。
+
+    Returns:
+        dict: 'addresses'、'dates'，以及形狀為 (鯨魚數, 天數) 的
+              'changes' (SUI)、'zscore'、'is_anomaly'、'change_point'。
+    """
+    addresses, dates = matrix['addresses'], matrix['dates']
+    changes = cohort_daily_changes(matrix)
+
+    fresh = RollingAnomalyDetector(len(addresses), **detector_kwargs)
+    detector, stored = RollingAnomalyDetector.load(state_path)
+    n_done = 0
+    if detector is not None and detector.params() == fresh.params() and all(key in stored for key in _HISTORY_KEYS):
+        n_done = len(stored['dates'])
+        resumable = (np.array_equal(stored['addresses'], addresses) and n_done <= len(dates)
+                     and np.array_equal(stored['dates'], dates[:n_done])
+                     and np.allclose(stored['changes'], changes[:, :n_done], equal_nan=True))
+        if not resumable:
+            n_done = 0
+    if n_done == 0:
+        detector = fresh
+        stored = {key: np.empty((len(addresses), 0)) for key in ('zscore', 'is_anomaly', 'change_point')}
+
+    zscore, is_anomaly, change_point = run_detector(detector, changes[:, n_done:])
+    result = {
+        'addresses': addresses,
+        'dates': dates,
+        'changes': changes,
+        'zscore': np.concatenate([stored['zscore'], zscore], axis=1),
+        'is_anomaly': np.concatenate([stored['is_anomaly'], is_anomaly], axis=1).astype(bool),
+        'change_point': np.concatenate([stored['change_point'], change_point], axis=1).astype(bool),
+    }
+    if n_done < len(dates):
+        try:
+            detector.save(state_path, **result)
+        except Exception as e:
+            print(f"寫入異常偵測狀態時發生錯誤：{e}")
+    return result
+
+
+def anomalies_table(result, include_all=False):
+    """
+    將偵測結果整理成長表 (每位鯨魚每個有數據的日子一列)。
+
+    Args:
+        result (dict): update_cohort_anomalies 的回傳值。
+        include_all (bool): False 時只保留異常日與變點。
+
+    Returns:
+        pandas.DataFrame: 欄位為 'owner_address'、'date'、'net_sui_change_sui'、'zscore'、'is_anomaly'、'change_point'。
+    """
+    rows, cols = np.nonzero(~np.isnan(result['changes']))
+    table = pd.DataFrame({
+        'owner_address': result['addresses'][rows],
+        'date': pd.to_datetime(result['dates'][cols]),
+        'net_sui_change_sui': result['changes'][rows, cols],
+        'zscore': result['zscore'][rows, cols],
+        'is_anomaly': result['is_anomaly'][rows, cols],
+        'change_point': result['change_point'][rows, cols],
+    })
+    if not include_all:
+        table = table[table['is_anomaly'] | table['change_point']]
+    return table.sort_values(['date', 'owner_address']).reset_index(drop=True)
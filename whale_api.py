@@ -0,0 +1,254 @@
+import io
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import whale_analytics
+import whale_export
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8600
+DEFAULT_WORKERS = 4
+
+# /sql 一次最多回傳的列數；更大的結果請改用 /export/sql 串流下載
+MAX_SQL_ROWS = 10_000
+
+# 用戶端連線後遲遲不送出請求 (或傳輸停滯) 時，工作執行緒最多等待的秒數
+REQUEST_TIMEOUT = 15
+
+
+class WorkerPoolHTTPServer(HTTPServer):
+    """以固定大小的執行緒池處理請求的 HTTP 伺服器。"""
+
+    def __init__(self, server_address, handler_class, datasets, workers=DEFAULT_WORKERS):
+        super().__init__(server_address, handler_class)
+        self.top10_whales, self.top1_balance, self.whales_usdt, self.top1_transactions = datasets
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="whale-api")
+        self._local = threading.local()
+
+    def sql_connection(self):
+        """
+        取得目前工作執行緒專屬的 SQLite 連線。
+
+        每個工作執行緒只在第一次處理 SQL 請求時載入一次交易表，之後重複使用；
+        連線由 connect_tables 設定 authorizer，使用者的 SQL 只能讀取、無法改動或 ATTACH。
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = whale_export.connect_tables({whale_analytics.TRANSACTIONS_TABLE: self.top1_transactions})
+            self._local.conn = conn
+        return conn
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=True)
+
+
+class _ChunkedWriter(io.RawIOBase):
+    """將寫入的位元組包裝成 HTTP chunked transfer encoding 送出。"""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        if data:
+            self._wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def finish(self):
+        self._wfile.write(b"0\r\n\r\n")
+        self._wfile.flush()
+
+
+class WhaleAPIHandler(BaseHTTPRequestHandler):
+    """
+    LookSuiBig 分析 API。
+
+    GET  /health
+    GET  /whales/top?n=10
+    GET  /balance
+    GET  /flows
+    GET  /sql?query=...            (亦可 POST JSON：{"query": "..."})
+    GET  /export/sql?query=...&format=csv&compression=gzip
+    GET  /export/whales/<name>?format=parquet
+    GET  /export/transactions?start_ms=...&end_ms=...
+    """
+
+    # 使用 HTTP/1.1 才能以 chunked 串流匯出；但每個連線會佔住一個工作執行緒，
+    # 所以每次回應後都關閉連線 (不保持 keep-alive)，並設定逾時以釋放閒置的連線
+    protocol_version = "HTTP/1.1"
+    timeout = REQUEST_TIMEOUT
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self._dispatch(url.path.rstrip("/") or "/", params)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json({"error": "請求內容不是合法的 JSON"}, status=400)
+            return
+        if not isinstance(params, dict):
+            self._send_json({"error": "請求內容必須是 JSON 物件"}, status=400)
+            return
+        self._dispatch(url.path.rstrip("/") or "/", params)
+
+    def _dispatch(self, path, params):
+        server = self.server
+        try:
+            if path == "/health":
+                self._send_json({"status": "ok"})
+            elif path == "/whales/top":
+                whales = whale_analytics.top_n_whales(int(params.get("n", 10)))
+                if whales is None:
+                    self._send_json({"error": "無法讀取鯨魚持有者列表"}, status=500)
+                else:
+                    self._send_frame(whales)
+            elif path == "/balance":
+                self._send_frame(whale_analytics.balance_series(server.top1_balance))
+            elif path == "/flows":
+                flows = whale_analytics.fund_flows()
+                self._send_json({
+                    "flows": json.loads(flows.to_json(orient="records", force_ascii=False)),
+                    "totals": json.loads(whale_analytics.fund_flow_totals(flows).to_json(orient="records", force_ascii=False)),
+                })
+            elif path == "/sql":
+                if not params.get("query"):
+                    self._send_json({"error": "缺少 query 參數"}, status=400)
+                    return
+                result = whale_analytics.run_sql(params["query"], server.sql_connection(), max_rows=MAX_SQL_ROWS)
+                self._send_frame(result)
+            elif path == "/export/sql":
+                if not params.get("query"):
+                    self._send_json({"error": "缺少 query 參數"}, status=400)
+                    return
+                self._send_export(
+                    whale_export.iter_query_batches(params["query"], server.sql_connection()),
+                    "query_result", params
+                )
+            elif path.startswith("/export/whales/"):
+                name = path.rsplit("/", 1)[-1]
+                if name not in whale_export.WHALE_LISTS:
+                    self._send_json({"error": f"未知的鯨魚列表：{name}"}, status=404)
+                    return
+                whales = whale_export.load_whale_list(name)
+                self._send_export(whale_export.iter_dataframe_batches(whales), name, params,
+                                  lambda: whale_export.frame_schema(whales))
+            elif path == "/export/transactions":
+                start_ms = int(params["start_ms"]) if params.get("start_ms") else None
+                end_ms = int(params["end_ms"]) if params.get("end_ms") else None
+                self._send_export(
+                    whale_export.iter_transaction_batches(server.sql_connection(), start_ms, end_ms,
+                                                          table=whale_analytics.TRANSACTIONS_TABLE),
+                    "top1_transactions", params,
+                    lambda: whale_export.sqlite_table_schema(server.sql_connection(), whale_analytics.TRANSACTIONS_TABLE)
+                )
+            else:
+                self._send_json({"error": f"找不到路徑：{path}"}, status=404)
+        except (ValueError, KeyError) as e:
+            self._send_json({"error": f"參數錯誤：{e}"}, status=400)
+        except sqlite3.Error as e:
+            self._send_json({"error": f"查詢時發生錯誤：{e}"}, status=400)
+        except Exception as e:
+            self._send_json({"error": f"處理請求時發生錯誤：{e}"}, status=500)
+
+    def end_headers(self):
+        if not self.close_connection:
+            self.send_header("Connection", "close")
+        super().end_headers()
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_frame(self, df):
+        body = df.to_json(orient="records", date_format="iso", force_ascii=False).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_export(self, batches, base_name, params, make_schema=None):
+        fmt = params.get("format", "csv")
+        compression = params.get("compression", "none")
+        if fmt not in whale_export.EXPORT_FORMATS:
+            raise ValueError(f"不支援的匯出格式：{fmt}")
+        allowed = whale_export.CSV_COMPRESSIONS if fmt == "csv" else whale_export.PARQUET_COMPRESSIONS
+        if compression not in allowed:
+            raise ValueError(f"{fmt} 不支援的壓縮格式：{compression}")
+
+        # 先取得第一批，讓查詢語法錯誤能以 JSON 錯誤回應，而不是中斷一半的下載
+        batches = iter(batches)
+        first = next(batches)
+
+        self.send_response(200)
+        self.send_header("Content-Type", whale_export.export_mime_type(fmt, compression))
+        self.send_header("Content-Disposition",
+                         f'attachment; filename="{whale_export.export_file_name(base_name, fmt, compression)}"')
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def all_batches():
+            yield first
+            yield from batches
+
+        writer = _ChunkedWriter(self.wfile)
+        try:
+            schema = make_schema() if make_schema is not None and fmt == "parquet" else None
+            whale_export.export_batches(all_batches(), writer, fmt, compression, schema)
+        except Exception as e:
+            # 標頭已送出，只能中斷連線讓用戶端知道下載不完整
+            self.log_error("匯出途中發生錯誤：%s", e)
+            self.close_connection = True
+            return
+        writer.finish()
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, workers=DEFAULT_WORKERS):
+    """載入數據並啟動分析 API，直到按下 Ctrl+C。"""
+    datasets = whale_analytics.load_datasets()
+    server = WorkerPoolHTTPServer((host, port), WhaleAPIHandler, datasets, workers)
+    print(f"LookSuiBig 分析 API 已啟動：http://{host}:{port} (工作執行緒 {workers} 個)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在關閉 API...")
+    finally:
+        server.server_close()
+
+
+# --- 主程式執行區 ---
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,106 @@
+import argparse
+import sys
+
+import whale_analytics
+import whale_anomaly
+import whale_api
+import whale_cohort
+import whale_rank_history
+
+OUTPUT_FORMATS = ('table', 'csv', 'json')
+
+
+def print_frame(df, fmt='table'):
+    """依指定格式將 DataFrame 輸出到標準輸出。"""
+    if fmt == 'csv':
+        df.to_csv(sys.stdout, index=False)
+    elif fmt == 'json':
+        print(df.to_json(orient="records", date_format="iso", force_ascii=False))
+    else:
+        print(df.to_string(index=False))
+
+
+def positive_int(value):
+    """argparse 型別檢查：正整數。"""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"必須為正整數：{value}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LookSuiBig 分析工具 (不需啟動 Streamlit)。")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="table", help="輸出格式")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    top_parser = subparsers.add_parser("top", help="列出持有量前 N 名的鯨魚")
+    top_parser.add_argument("-n", type=int, default=10, help="名次數量")
+    top_parser.add_argument("--input", default=whale_analytics.WHALE_HOLDERS_PATH, help="持有者列表的 Excel 檔案")
+
+    subparsers.add_parser("balance", help="輸出 Top 1 鯨魚的每日 SUI 餘額序列")
+
+    anomaly_parser = subparsers.add_parser("anomalies", help="列出 Top 10 鯨魚每日淨變化的異常日與變點")
+    anomaly_parser.add_argument("--window", type=positive_int, default=whale_anomaly.DEFAULT_WINDOW, help="滾動視窗長度 (天)")
+    anomaly_parser.add_argument("--threshold", type=float, default=whale_anomaly.DEFAULT_Z_THRESHOLD, help="z-score 門檻")
+
+    rank_parser = subparsers.add_parser("rank", help="查詢地址在歷次快照中的排名，或進榜/出榜紀錄")
+    rank_parser.add_argument("address", nargs="?", help="鯨魚地址；省略時列出所有地址的進榜/出榜紀錄")
+    rank_parser.add_argument("--events", action="store_true", help="改為輸出該地址的進榜/出榜與名次變化紀錄")
+    rank_parser.add_argument("--history", default=whale_rank_history.DEFAULT_HISTORY_PATH, help="排名歷史檔案")
+
+    sql_parser = subparsers.add_parser("sql", help="對 top1_transactions 表格執行 SQL 查詢")
+    sql_parser.add_argument("query", help="SQL 查詢語句")
+
+    flows_parser = subparsers.add_parser("flows", help="輸出資金流向 (模擬數據)")
+    flows_parser.add_argument("--totals", action="store_true", help="改為輸出各節點的流入/流出彙總")
+
+    serve_parser = subparsers.add_parser("serve", help="啟動本機 HTTP 分析 API")
+    serve_parser.add_argument("--host", default=whale_api.DEFAULT_HOST)
+    serve_parser.add_argument("--port", type=int, default=whale_api.DEFAULT_PORT)
+    serve_parser.add_argument("--workers", type=int, default=whale_api.DEFAULT_WORKERS, help="工作執行緒數量")
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "top":
+            whales = whale_analytics.top_n_whales(args.n, args.input)
+            if whales is None:
+                return 1
+            print_frame(whales, args.format)
+        elif args.command == "balance":
+            _, top1_balance, _, _ = whale_analytics.load_datasets()
+            print_frame(whale_analytics.balance_series(top1_balance), args.format)
+        elif args.command == "anomalies":
+            top10_whales, top1_balance, _, _ = whale_analytics.load_datasets()
+            result = whale_anomaly.update_cohort_anomalies(whale_cohort.load_top10_matrix(top10_whales, top1_balance),
+                                                           window=args.window, z_threshold=args.threshold)
+            print_frame(whale_anomaly.anomalies_table(result), args.format)
+        elif args.command == "rank":
+            history = whale_rank_history.load_history(args.history)
+            if args.address and not args.events:
+                print_frame(whale_rank_history.rank_over_time(history, args.address), args.format)
+            else:
+                events = whale_rank_history.events_table(history)
+                if args.address:
+                    events = events[events['owner_address'] == args.address]
+                print_frame(events, args.format)
+        elif args.command == "sql":
+            _, _, _, top1_transactions = whale_analytics.load_datasets()
+            print_frame(whale_analytics.run_sql(args.query, top1_transactions), args.format)
+        elif args.command == "flows":
+            flows = whale_analytics.fund_flows()
+            print_frame(whale_analytics.fund_flow_totals(flows) if args.totals else flows, args.format)
+        elif args.command == "serve":
+            whale_api.serve(args.host, args.port, args.workers)
+    except FileNotFoundError as e:
+        print(f"錯誤：找不到必要的 Excel 檔案 - {e}。", file=sys.stderr)
+        return 1
+    except Exception as e:
+        print(f"執行時發生錯誤：{e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+# --- 主程式執行區 ---
+if __name__ == "__main__":
+    sys.exit(main())
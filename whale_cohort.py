@@ -0,0 +1,251 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import whale_analytics
+
+# 矩陣快取的預設位置 (壓縮後的 .npz 檔)
+DEFAULT_CACHE_PATH = "data/cache/cohort_balance_matrix.npz"
+
+
+def build_balance_matrix(daily_balances, addresses=None):
+    """
+    將「地址 × 日期」的每日餘額長表轉換成稀疏的餘額矩陣。
+
+    矩陣以 COO 格式 (row, col, value) 儲存，只保留實際觀測到的格子；
+    沒有每日數據的地址仍會佔一列，但不會產生任何儲存成本。
+
+    Args:
+        daily_balances (pandas.DataFrame): 需包含 'owner_address'、'transaction_date'
+                                           與 'balance_at_end_of_day' 三個欄位。
+        addresses (list, optional): 群體中的地址 (例如 Top 10 鯨魚)，決定矩陣的列順序。
+                                    若為 None，則使用長表中出現過的地址。
+
+    Returns:
+        dict: 包含 'addresses'、'dates'、'rows'、'cols'、'values' 的 NumPy 陣列字典。
+    """
+    df = daily_balances[['owner_address', 'transaction_date', 'balance_at_end_of_day']].copy()
+    df['transaction_date'] = pd.to_datetime(df['transaction_date'], errors='coerce')
+    df['balance_at_end_of_day'] = pd.to_numeric(df['balance_at_end_of_day'], errors='coerce')
+    df.dropna(subset=['transaction_date', 'balance_at_end_of_day'], inplace=True)
+
+    if addresses is None:
+        addresses = pd.unique(df['owner_address'])
+    addresses = np.asarray(list(addresses), dtype=str)
+
+    # 不在群體中的地址直接略過
+    df = df[df['owner_address'].isin(addresses)]
+    day_values = df['transaction_date'].to_numpy().astype('datetime64[D]')
+
+    if len(day_values) == 0:
+        dates = np.array([], dtype='datetime64[D]')
+        cols = np.array([], dtype=np.int32)
+    else:
+        # 日期軸為連續的日曆天，方便後續以向量方式計算每日變化
+        dates = np.arange(day_values.min(), day_values.max() + np.timedelta64(1, 'D'))
+        cols = (day_values - dates[0]).astype(np.int32)
+
+    row_index = {address: i for i, address in enumerate(addresses)}
+    rows = df['owner_address'].map(row_index).to_numpy(dtype=np.int32)
+
+    return {
+        'addresses': addresses,
+        'dates': dates,
+        'rows': rows,
+        'cols': cols,
+        'values': df['balance_at_end_of_day'].to_numpy(dtype=np.float64),
+    }
+
+
+def to_dense(matrix):
+    """
+    將稀疏餘額矩陣展開成密集陣列，並以前值填補 (forward fill) 沒有交易的日子。
+
+    首次觀測之前的格子維持 NaN，代表「未知」而非「餘額為零」。
+
+    Args:
+        matrix (dict): build_balance_matrix 的回傳值。
+
+    Returns:
+        numpy.ndarray: 形狀為 (地址數, 天數) 的 float64 陣列。
+    """
+    n_rows, n_cols = len(matrix['addresses']), len(matrix['dates'])
+    dense = np.full((n_rows, n_cols), np.nan)
+    dense[matrix['rows'], matrix['cols']] = matrix['values']
+
+    # 向量化的 forward fill：記錄每格最近一次觀測的欄位索引，再一次性取值
+    observed = ~np.isnan(dense)
+    last_seen = np.where(observed, np.arange(n_cols), 0)
+    np.maximum.accumulate(last_seen, axis=1, out=last_seen)
+    filled = dense[np.arange(n_rows)[:, None], last_seen]
+    filled[np.maximum.accumulate(observed, axis=1) == 0] = np.nan
+    return filled
+
+
+def cohort_net_flow(dense):
+    """
+    計算群體每日的 SUI 淨流入/流出。
+
+    Args:
+        dense (numpy.ndarray): to_dense 的回傳值。
+
+    Returns:
+        numpy.ndarray: 每日淨變化 (長度為天數)，第一天固定為 0。
+    """
+    if dense.shape[1] == 0:
+        return np.array([])
+    changes = np.diff(dense, axis=1, prepend=dense[:, :1])
+    return np.nansum(changes, axis=0)
+
+
+def concentration_metrics(balances):
+    """
+    計算持有量的集中度指標 (Gini 係數與 HHI)。
+
+    Args:
+        balances (numpy.ndarray): 一維時為單一時間點的各地址餘額，NaN 視為 0；
+                                  二維時每一欄為一天 (例如 to_dense 的輸出)，會逐日向量化計算，
+                                  NaN 代表該地址當天沒有數據，只以有觀測值的地址計算。
+
+    Returns:
+        tuple: (gini, hhi)，輸入為二維時兩者皆為逐日陣列；
+               某天有觀測值的地址少於 2 個時，該天為 NaN。
+    """
+    x = np.asarray(balances, dtype=np.float64)
+    squeeze = x.ndim == 1
+    if squeeze:
+        x = np.nan_to_num(x)[:, None]
+    valid = ~np.isnan(x)
+    x = np.clip(x, 0, None)
+
+    n = valid.sum(axis=0)
+    totals = np.nansum(x, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hhi = np.nansum(np.square(x / totals), axis=0)
+        # Gini = Σ(2i - n - 1) x_(i) / (n Σx)，其中 x_(i) 為遞增排序後的值；
+        # np.sort 會把 NaN 排到最後，所以每欄前 n 個位置正好是當天有觀測值的地址
+        ranks = np.arange(1, x.shape[0] + 1)[:, None]
+        weights = np.where(ranks <= n, 2 * ranks - n - 1, 0)
+        gini = (weights * np.nan_to_num(np.sort(x, axis=0))).sum(axis=0) / (n * totals)
+    undefined = (totals == 0) | (n < (1 if squeeze else 2))
+    gini[undefined] = np.nan
+    hhi[undefined] = np.nan
+
+    if squeeze:
+        return float(gini[0]), float(hhi[0])
+    return gini, hhi
+
+
+def whale_correlation(dense):
+    """
+    計算鯨魚之間每日餘額變化的相關係數矩陣。
+
+    沒有足夠數據 (少於兩天有變化) 的地址，其相關係數為 NaN。
+
+    Args:
+        dense (numpy.ndarray): to_dense 的回傳值。
+
+    Returns:
+        numpy.ndarray: 形狀為 (地址數, 地址數) 的相關係數矩陣。
+    """
+    n_rows = dense.shape[0]
+    corr = np.full((n_rows, n_rows), np.nan)
+    if dense.shape[1] < 3:
+        return corr
+
+    changes = np.diff(dense, axis=1)
+    valid = np.isfinite(changes)
+    changes = np.where(valid, changes, 0.0)
+    counts = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = changes.sum(axis=1) / counts
+    centered = np.where(valid, changes - means[:, None], 0.0)
+
+    # 只用兩個地址都有數據的日子計算 (pairwise complete)
+    cov = centered @ centered.T
+    var = np.square(centered) @ valid.T.astype(np.float64)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        corr = cov / np.sqrt(var * var.T)
+    corr[np.outer(counts, counts) == 0] = np.nan
+    return corr
+
+
+def save_matrix(matrix, cache_path=DEFAULT_CACHE_PATH, signature=""):
+    """將稀疏餘額矩陣以壓縮的 .npz 格式寫入磁碟。"""
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    np.savez_compressed(cache_path, source_signature=np.array(signature), **matrix)
+
+
+def load_matrix(cache_path=DEFAULT_CACHE_PATH, signature=""):
+    """
+    從磁碟讀取稀疏餘額矩陣。
+
+    Returns:
+        dict: 矩陣字典；若快取不存在或來源已變更，則回傳 None。
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as cached:
+            if str(cached['source_signature']) != signature:
+                return None
+            return {key: cached[key] for key in ('addresses', 'dates', 'rows', 'cols', 'values')}
+    except Exception as e:
+        print(f"讀取矩陣快取時發生錯誤：{e}")
+        return None
+
+
+def source_signature(*paths):
+    """以來源檔案的修改時間與大小組成簽章，用來判斷快取是否過期。"""
+    parts = []
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+        else:
+            parts.append(f"{path}:missing")
+    return "|".join(parts)
+
+
+def load_or_build_matrix(daily_balances, addresses, source_paths, cache_path=DEFAULT_CACHE_PATH):
+    """
+    優先讀取磁碟上的矩陣快取，來源檔案變更時才重新建立並寫回快取。
+
+    Args:
+        daily_balances (pandas.DataFrame): 傳給 build_balance_matrix 的每日餘額長表。
+        addresses (list): 群體中的地址。
+        source_paths (list): 產生 daily_balances 的來源檔案，用於快取失效判斷。
+        cache_path (str): 快取檔案路徑。
+
+    Returns:
+        dict: 稀疏餘額矩陣。
+    """
+    signature = source_signature(*source_paths) + "|" + ",".join(addresses)
+    matrix = load_matrix(cache_path, signature)
+    if matrix is not None:
+        return matrix
+
+    matrix = build_balance_matrix(daily_balances, addresses)
+    try:
+        save_matrix(matrix, cache_path, signature)
+    except Exception as e:
+        print(f"寫入矩陣快取時發生錯誤：{e}")
+    return matrix
+
+
+def load_top10_matrix(top10_whales, top1_balance):
+    """
+    以 Top 10 鯨魚列表與每日餘額數據建立 (或讀取快取的) 群體餘額矩陣。
+
+    目前僅 Top 1 鯨魚有每日餘額，其餘地址的列為空，補上數據後即自動納入。
+    """
+    addresses = top10_whales.iloc[:, 0].astype(str).tolist()
+    daily_balances = top1_balance.copy()
+    daily_balances['owner_address'] = addresses[0]
+    return load_or_build_matrix(
+        daily_balances, addresses,
+        source_paths=[whale_analytics.TOP10_WHALES_PATH, whale_analytics.TOP1_BALANCE_PATH]
+    )
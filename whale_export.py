@@ -0,0 +1,382 @@
+import argparse
+import csv
+import gzip
+import io
+import os
+import sqlite3
+
+import pandas as pd
+
+# 每批次從查詢引擎取出的列數
+DEFAULT_BATCH_SIZE = 50_000
+
+# 決定 Parquet schema 前最多暫存的批次數 (等待全為 NULL 的欄位出現實際值以推斷型別)
+SCHEMA_BUFFER_BATCHES = 8
+
+EXPORT_FORMATS = ('csv', 'parquet')
+
+# CSV 僅支援 gzip；Parquet 的壓縮在檔案內部以欄位區塊 (column chunk) 為單位進行
+CSV_COMPRESSIONS = ('none', 'gzip')
+PARQUET_COMPRESSIONS = ('none', 'snappy', 'gzip', 'zstd')
+
+# 可匯出的鯨魚列表 (名稱 → (Excel 路徑, 標題列))
+WHALE_LISTS = {
+    'top10_sui': ("data/top10_sui_whale.xlsx", 0),
+    'sui': ("data/whale_sui.xlsx", 1),
+    'usdt': ("data/whales_usdt.xlsx", 1),
+}
+
+TRANSACTIONS_PATH = "data/whale_sui_top1_sui_transactions.xlsx"
+
+
+# 使用者 SQL 只允許讀取：SELECT、讀取欄位、呼叫函數與遞迴 CTE；
+# PRAGMA 只放行唯讀的 table_info (匯出時讀取宣告型別)，其餘 PRAGMA、ATTACH 與所有寫入/DDL 一律拒絕
+_READ_ONLY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+
+
+def _read_only_authorizer(action, arg1, arg2, db_name, trigger):
+    if action in _READ_ONLY_ACTIONS:
+        return sqlite3.SQLITE_OK
+    if action == sqlite3.SQLITE_PRAGMA and arg1 == 'table_info':
+        return sqlite3.SQLITE_OK
+    return sqlite3.SQLITE_DENY
+
+
+def connect_tables(tables):
+    """
+    建立 SQLite 記憶體資料庫，並將 DataFrame 註冊成同名的表格。
+
+    SQL 查詢工作區、匯出與 HTTP API 都使用這個 SQLite 查詢引擎，
+    因此同一段查詢語句在各處的行為一致。
+
+    Args:
+        tables (dict): 表格名稱 → pandas.DataFrame。
+
+    Returns:
+        sqlite3.Connection: 已載入表格的唯讀連線。
+    """
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    for name, df in tables.items():
+        df.to_sql(name, conn, index=False)
+    # 載入完成後以 authorizer 限制為唯讀：查詢語句本身無法解除 (不同於 PRAGMA query_only)，
+    # 連線會在 API 工作執行緒間重複使用，也不能讓使用者 ATTACH 其他資料庫檔案
+    conn.set_authorizer(_read_only_authorizer)
+    conn.setlimit(sqlite3.SQLITE_LIMIT_ATTACHED, 0)
+    return conn
+
+
+def iter_query_batches(query, tables, batch_size=DEFAULT_BATCH_SIZE, params=()):
+    """
+    執行 SQL 查詢，並以批次方式逐步回傳結果，不會一次把整個結果集載入記憶體。
+
+    Args:
+        query (str): SQL 查詢語句。
+        tables (dict | sqlite3.Connection): 表格字典，或 connect_tables 建立的連線。
+        batch_size (int): 每批次的列數。
+        params (tuple): 查詢參數。
+
+    Yields:
+        pandas.DataFrame: 每批次的查詢結果。
+    """
+    owns_conn = not isinstance(tables, sqlite3.Connection)
+    conn = connect_tables(tables) if owns_conn else tables
+    try:
+        cursor = conn.execute(query, params)
+        columns = [col[0] for col in cursor.description or []]
+        emitted = False
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            emitted = True
+            yield pd.DataFrame.from_records(rows, columns=columns)
+        if not emitted:
+            # 結果為空時仍回傳一個只有欄位的批次，讓輸出檔保有標題列
+            yield pd.DataFrame(columns=columns)
+    finally:
+        if owns_conn:
+            conn.close()
+
+
+def iter_dataframe_batches(df, batch_size=DEFAULT_BATCH_SIZE):
+    """將已載入的 DataFrame 切成批次 (只建立切片，不複製整份資料)。"""
+    if df.empty:
+        yield df
+        return
+    for start in range(0, len(df), batch_size):
+        yield df.iloc[start:start + batch_size]
+
+
+def iter_transaction_batches(transactions, start_ms=None, end_ms=None, batch_size=DEFAULT_BATCH_SIZE,
+                             table='transactions'):
+    """
+    依時間範圍 (timestamp_ms，含頭含尾) 批次取出交易紀錄。
+
+    Args:
+        transactions (pandas.DataFrame | sqlite3.Connection): 交易數據，或已載入交易表的連線。
+        start_ms (int, optional): 起始時間 (毫秒)。
+        end_ms (int, optional): 結束時間 (毫秒)。
+        batch_size (int): 每批次的列數。
+        table (str): 連線中交易表的名稱。
+
+    Yields:
+        pandas.DataFrame: 每批次的交易紀錄，依時間排序。
+    """
+    tables = transactions if isinstance(transactions, sqlite3.Connection) else {table: transactions}
+    query = f"SELECT * FROM {table} WHERE (? IS NULL OR timestamp_ms >= ?) AND (? IS NULL OR timestamp_ms <= ?) ORDER BY timestamp_ms"
+    params = (start_ms, start_ms, end_ms, end_ms)
+    yield from iter_query_batches(query, tables, batch_size, params)
+
+
+# SQLite 宣告型別 → Arrow 型別；pandas.to_sql 會把日期時間存成 TIMESTAMP，查詢時以文字取回
+_SQLITE_ARROW_TYPES = {'INTEGER': 'int64', 'REAL': 'float64', 'TEXT': 'string', 'TIMESTAMP': 'string'}
+
+
+def frame_schema(df, via_sqlite=False):
+    """
+    由整份 DataFrame 推斷 Parquet schema，讓稀疏欄位的型別不受批次大小影響。
+
+    Args:
+        df (pandas.DataFrame): 匯出的來源數據。
+        via_sqlite (bool): 批次是否經由 SQLite 查詢取回 (日期時間欄位會變成文字)。
+
+    Returns:
+        pyarrow.Schema: 未安裝 pyarrow 時回傳 None。
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    if via_sqlite:
+        schema = pa.schema([field.with_type(pa.string()) if pa.types.is_temporal(field.type) else field
+                            for field in schema], metadata=schema.metadata)
+    return schema
+
+
+def sqlite_table_schema(conn, table):
+    """
+    以 PRAGMA table_info 的宣告型別建立 Parquet schema。
+
+    Returns:
+        pyarrow.Schema: 未安裝 pyarrow 時回傳 None。
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return None
+    columns = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    return pa.schema([(name, pa.type_for_alias(_SQLITE_ARROW_TYPES.get(decl_type.upper(), 'string')))
+                      for _, name, decl_type, *_ in columns])
+
+
+def transaction_schema(transactions, table='transactions'):
+    """回傳 iter_transaction_batches 輸出批次的 Parquet schema。"""
+    if isinstance(transactions, sqlite3.Connection):
+        return sqlite_table_schema(transactions, table)
+    return frame_schema(transactions, via_sqlite=True)
+
+
+def _csv_value(value):
+    # pandas 的 NaN / None 在 CSV 中輸出為空字串，與 to_csv 的預設行為一致
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return value
+
+
+def write_csv(batches, out, compression='none'):
+    """
+    將批次逐一寫成 CSV，每一批寫完即釋放。
+
+    Args:
+        batches (iterable): pandas.DataFrame 的迭代器。
+        out (str | file): 輸出路徑，或可寫入位元組的檔案物件 (例如 HTTP 回應串流)。
+        compression (str): 'none' 或 'gzip'。
+
+    Returns:
+        int: 寫入的資料列數。
+    """
+    if compression not in CSV_COMPRESSIONS:
+        raise ValueError(f"CSV 不支援的壓縮格式：{compression}")
+
+    raw = open(out, 'wb') if isinstance(out, (str, os.PathLike)) else out
+    binary = gzip.GzipFile(fileobj=raw, mode='wb') if compression == 'gzip' else raw
+    text = io.TextIOWrapper(binary, encoding='utf-8', newline='', write_through=True)
+    rows_written = 0
+    try:
+        writer = csv.writer(text)
+        header_written = False
+        for batch in batches:
+            if not header_written:
+                writer.writerow(batch.columns)
+                header_written = True
+            for row in batch.itertuples(index=False, name=None):
+                writer.writerow([_csv_value(v) for v in row])
+            rows_written += len(batch)
+            text.flush()
+    finally:
+        # 只關閉自己建立的包裝層，呼叫端傳入的串流交由呼叫端處理
+        text.detach()
+        if binary is not raw:
+            binary.close()
+        if raw is not out:
+            raw.close()
+    return rows_written
+
+
+def write_parquet(batches, out, compression='snappy', schema=None):
+    """
+    將批次逐一寫成 Parquet 的 row group，記憶體中最多只保留一個批次。
+
+    需要安裝 pyarrow：pip install pyarrow
+
+    Args:
+        batches (iterable): pandas.DataFrame 的迭代器。
+        out (str | file): 輸出路徑，或可寫入位元組的檔案物件。
+        compression (str): 'none'、'snappy'、'gzip' 或 'zstd'。
+        schema (pyarrow.Schema, optional): 由來源推斷的 schema (frame_schema、sqlite_table_schema)。
+            未提供時 (例如任意 SQL 查詢的計算欄位沒有宣告型別) 才改由批次內容推斷，見下方說明。
+
+    Returns:
+        int: 寫入的資料列數。
+    """
+    if compression not in PARQUET_COMPRESSIONS:
+        raise ValueError(f"Parquet 不支援的壓縮格式：{compression}")
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("匯出 Parquet 需要 pyarrow，請執行：pip install pyarrow")
+
+    def open_writer(tables, fill_nulls):
+        # 以暫存批次合併出的 schema 開啟檔案；仍未出現實際值的 NULL 欄位改用字串，之後的值都能轉入
+        unified = pa.unify_schemas([table.schema for table in tables], promote_options='permissive')
+        if fill_nulls:
+            unified = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                 for field in unified], metadata=unified.metadata)
+        return unified, pq.ParquetWriter(out, unified, compression=None if compression == 'none' else compression)
+
+    declared = schema is not None
+    writer = None
+    pending = []
+    rows_written = 0
+    try:
+        if declared:
+            writer = pq.ParquetWriter(out, schema, compression=None if compression == 'none' else compression)
+        for batch in batches:
+            rows_written += len(batch)
+            if declared:
+                writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+                continue
+
+            table = pa.Table.from_pandas(batch, preserve_index=False)
+            if writer is not None:
+                writer.write_table(table if table.schema.equals(schema) else table.cast(schema))
+                continue
+
+            # 沒有來源 schema 時的後備做法：查詢結果的欄位可能在前幾批全為 NULL 而被推斷成 null 型別，
+            # 先暫存最多 SCHEMA_BUFFER_BATCHES 個批次等待實際值出現；仍為 NULL 的欄位改存成字串，
+            # 因此這類欄位的型別可能隨批次大小而不同
+            pending.append(table)
+            unified = pa.unify_schemas([t.schema for t in pending], promote_options='permissive')
+            if any(pa.types.is_null(field.type) for field in unified) and len(pending) < SCHEMA_BUFFER_BATCHES:
+                continue
+            schema, writer = open_writer(pending, fill_nulls=True)
+            for buffered in pending:
+                writer.write_table(buffered.cast(schema))
+            pending = []
+
+        if pending:
+            # 資料已全部讀完，剩下的 NULL 欄位確實沒有任何值，保留 null 型別即可
+            schema, writer = open_writer(pending, fill_nulls=False)
+            for buffered in pending:
+                writer.write_table(buffered.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows_written
+
+
+def export_batches(batches, out, fmt='csv', compression='none', schema=None):
+    """
+    依指定格式串流寫出批次。
+
+    Args:
+        batches (iterable): pandas.DataFrame 的迭代器。
+        out (str | file): 輸出路徑或檔案物件。
+        fmt (str): 'csv' 或 'parquet'。
+        compression (str): 壓縮格式，可用值見 CSV_COMPRESSIONS / PARQUET_COMPRESSIONS。
+        schema (pyarrow.Schema, optional): Parquet 的來源 schema，CSV 會忽略。
+
+    Returns:
+        int: 寫入的資料列數。
+    """
+    if fmt == 'csv':
+        return write_csv(batches, out, compression)
+    if fmt == 'parquet':
+        return write_parquet(batches, out, compression, schema)
+    raise ValueError(f"不支援的匯出格式：{fmt}")
+
+
+def export_file_name(base_name, fmt='csv', compression='none'):
+    """依格式與壓縮方式組出下載檔名，例如 top1_transactions.csv.gz。"""
+    if fmt == 'csv':
+        return f"{base_name}.csv.gz" if compression == 'gzip' else f"{base_name}.csv"
+    return f"{base_name}.parquet"
+
+
+def export_mime_type(fmt='csv', compression='none'):
+    """回傳下載檔案的 MIME 類型。"""
+    if fmt == 'csv':
+        return "application/gzip" if compression == 'gzip' else "text/csv"
+    return "application/vnd.apache.parquet"
+
+
+def load_whale_list(name):
+    """讀取 WHALE_LISTS 中指定名稱的鯨魚列表。"""
+    path, header = WHALE_LISTS[name]
+    return pd.read_excel(path, header=header)
+
+
+# --- 主程式執行區 ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="以批次串流的方式匯出 LookSuiBig 的鯨魚與交易數據。")
+    subparsers = parser.add_subparsers(dest="source", required=True)
+
+    sql_parser = subparsers.add_parser("sql", help="匯出 SQL 查詢結果 (表格名稱為 top1_transactions)")
+    sql_parser.add_argument("query", help="SQL 查詢語句")
+
+    whales_parser = subparsers.add_parser("whales", help="匯出鯨魚列表")
+    whales_parser.add_argument("name", choices=sorted(WHALE_LISTS), help="鯨魚列表名稱")
+
+    tx_parser = subparsers.add_parser("transactions", help="依時間範圍匯出交易紀錄")
+    tx_parser.add_argument("--start-ms", type=int, default=None, help="起始時間 (毫秒)")
+    tx_parser.add_argument("--end-ms", type=int, default=None, help="結束時間 (毫秒)")
+
+    for sub in (sql_parser, whales_parser, tx_parser):
+        sub.add_argument("-o", "--output", required=True, help="輸出檔案路徑")
+        sub.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+        sub.add_argument("--compression", default="none",
+                         choices=sorted(set(CSV_COMPRESSIONS + PARQUET_COMPRESSIONS)))
+        sub.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    args = parser.parse_args()
+
+    schema = None
+    if args.source == "sql":
+        transactions = pd.read_excel(TRANSACTIONS_PATH, header=1)
+        batches = iter_query_batches(args.query, {'top1_transactions': transactions}, args.batch_size)
+    elif args.source == "whales":
+        whales = load_whale_list(args.name)
+        batches = iter_dataframe_batches(whales, args.batch_size)
+        schema = frame_schema(whales) if args.format == 'parquet' else None
+    else:
+        transactions = pd.read_excel(TRANSACTIONS_PATH, header=1)
+        batches = iter_transaction_batches(transactions, args.start_ms, args.end_ms, args.batch_size)
+        schema = transaction_schema(transactions) if args.format == 'parquet' else None
+
+    try:
+        count = export_batches(batches, args.output, args.format, args.compression, schema)
+        print(f"成功！已匯出 {count} 筆資料至 '{args.output}'")
+    except Exception as e:
+        print(f"匯出時發生錯誤：{e}")
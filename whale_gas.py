@@ -0,0 +1,287 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import whale_analytics
+import whale_cohort
+
+# 預先彙總的直方圖快取位置 (壓縮後的 .npz 檔)
+DEFAULT_CACHE_PATH = "data/cache/gas_histograms.npz"
+
+# 直方圖的分箱：正負兩側各自以對數刻度切分 10^3 ~ 10^11 MIST (每十倍 50 格，單格寬度約 4.7%)，
+# 中間 (-10^3, 10^3) 為一格。total_gas_cost 扣除 storage rebate 後可能為負，所以需要負值區間。
+# 所有日期、鯨魚與交易類型共用同一組分箱，直方圖才能直接相加合併。
+BINS_PER_DECADE = 50
+_POSITIVE_EDGES = np.logspace(3, 11, 8 * BINS_PER_DECADE + 1)
+BIN_EDGES = np.concatenate([-_POSITIVE_EDGES[::-1], _POSITIVE_EDGES])
+N_BINS = len(BIN_EDGES) - 1
+
+
+def bin_index(values):
+    """將 Gas 費用 (MIST) 對應到分箱索引；超出範圍的值歸入最外側的分箱。"""
+    index = np.searchsorted(BIN_EDGES, values, side='right') - 1
+    return np.clip(index, 0, N_BINS - 1)
+
+
+def build_daily_histograms(transactions, address_col='sender', kind_col='transaction_kind'):
+    """
+    在匯入時將交易依 (日期, 鯨魚地址, 交易類型) 分組，預先彙總 Gas 費用直方圖。
+
+    之後任意時間範圍的查詢只需把對應分組的直方圖相加，不必再掃描原始交易。
+
+    Args:
+        transactions (pandas.DataFrame): 需包含 'timestamp_ms' 與 'total_gas_cost' 欄位。
+        address_col (str): 鯨魚地址欄位。
+        kind_col (str): 交易類型欄位。
+
+    Returns:
+        dict: 'dates'、'addresses'、'kinds' 為每個分組的鍵；
+              'counts' 為形狀 (分組數, N_BINS) 的直方圖；
+              'totals'、'mins'、'maxs' 為各分組的 Gas 總和與極值 (用於精確平均與邊界)。
+    """
+    timestamps = pd.to_numeric(transactions['timestamp_ms'], errors='coerce')
+    gas = pd.to_numeric(transactions['total_gas_cost'], errors='coerce')
+    valid = timestamps.notna() & gas.notna()
+    df = pd.DataFrame({
+        'date': pd.to_datetime(timestamps[valid], unit='ms').dt.floor('D'),
+        'address': transactions.loc[valid, address_col].astype(str),
+        'kind': transactions.loc[valid, kind_col].astype(str),
+        'gas': gas[valid].to_numpy(dtype=np.float64),
+    })
+
+    group_keys = df[['date', 'address', 'kind']].drop_duplicates().sort_values(['date', 'address', 'kind'])
+    group_keys = group_keys.reset_index(drop=True)
+    group_id = df.merge(group_keys.reset_index(), on=['date', 'address', 'kind'], how='left')['index'].to_numpy()
+
+    # 以一次 bincount 完成所有分組的直方圖，不需逐組迴圈
+    n_groups = len(group_keys)
+    flat = group_id * N_BINS + bin_index(df['gas'].to_numpy())
+    counts = np.bincount(flat, minlength=n_groups * N_BINS).reshape(n_groups, N_BINS).astype(np.uint32)
+
+    stats = df.assign(group=group_id).groupby('group')['gas'].agg(['sum', 'min', 'max']).reindex(range(n_groups))
+    return {
+        'dates': group_keys['date'].to_numpy().astype('datetime64[D]'),
+        'addresses': group_keys['address'].to_numpy().astype(str),
+        'kinds': group_keys['kind'].to_numpy().astype(str),
+        'counts': counts,
+        'totals': stats['sum'].to_numpy(dtype=np.float64),
+        'mins': stats['min'].to_numpy(dtype=np.float64),
+        'maxs': stats['max'].to_numpy(dtype=np.float64),
+    }
+
+
+def select_groups(histograms, start_date=None, end_date=None, addresses=None, kinds=None):
+    """回傳符合日期範圍 (含頭含尾)、地址與交易類型條件的分組遮罩。"""
+    mask = np.ones(len(histograms['dates']), dtype=bool)
+    if start_date is not None:
+        mask &= histograms['dates'] >= np.datetime64(pd.Timestamp(start_date).date(), 'D')
+    if end_date is not None:
+        mask &= histograms['dates'] <= np.datetime64(pd.Timestamp(end_date).date(), 'D')
+    if addresses is not None:
+        mask &= np.isin(histograms['addresses'], list(addresses))
+    if kinds is not None:
+        mask &= np.isin(histograms['kinds'], list(kinds))
+    return mask
+
+
+def histogram_percentiles(counts, percentiles, lower=None, upper=None):
+    """
+    由直方圖估算百分位數 (分箱內線性內插)。
+
+    Args:
+        counts (numpy.ndarray): 形狀 (N_BINS,) 或 (列數, N_BINS) 的直方圖。
+        percentiles (list): 0 ~ 100 的百分位數。
+        lower (float | numpy.ndarray, optional): 實際最小值，用來收斂最外側分箱的邊界。
+        upper (float | numpy.ndarray, optional): 實際最大值。
+
+    Returns:
+        numpy.ndarray: 形狀 (列數, 百分位數個數) 的估計值 (MIST)；輸入為一維時回傳一維。
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    squeeze = counts.ndim == 1
+    counts = np.atleast_2d(counts)
+    n_rows = counts.shape[0]
+    q = np.asarray(percentiles, dtype=np.float64) / 100.0
+
+    cumulative = np.cumsum(counts, axis=1)
+    totals = cumulative[:, -1:]
+    targets = q[None, :] * totals
+
+    # 對每一列找出目標累計次數所在的分箱 (等同逐列 searchsorted(side='left')，但一次完成)
+    rows = np.arange(n_rows)[:, None]
+    bins = (cumulative[:, :, None] < targets[:, None, :]).sum(axis=1)
+    bins = np.clip(bins, 0, N_BINS - 1)
+
+    left_edges = BIN_EDGES[bins]
+    right_edges = BIN_EDGES[bins + 1]
+    if lower is not None:
+        left_edges = np.maximum(left_edges, np.reshape(lower, (-1, 1)))
+    if upper is not None:
+        right_edges = np.minimum(right_edges, np.reshape(upper, (-1, 1)))
+    right_edges = np.maximum(right_edges, left_edges)
+
+    before = np.where(bins > 0, cumulative[rows, bins - 1], 0.0)
+    in_bin = counts[rows, bins]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(in_bin > 0, (targets - before) / in_bin, 0.0)
+    estimates = left_edges + np.clip(fraction, 0.0, 1.0) * (right_edges - left_edges)
+    estimates[totals[:, 0] == 0] = np.nan
+    return estimates[0] if squeeze else estimates
+
+
+def _merge_groups(histograms, mask, labels):
+    """
+    將符合遮罩的分組依標籤相加。
+
+    分組先依標籤排序，再逐段相加每個標籤的連續區間，避免 np.add.at 的逐元素累加。
+
+    Returns:
+        tuple: (標籤, 合併後的直方圖, Gas 總和, 最小值, 最大值)，依標籤排序。
+    """
+    index = np.nonzero(mask)[0]
+    order = np.argsort(labels[index], kind='stable')
+    index = index[order]
+    unique_labels, starts = np.unique(labels[index], return_index=True)
+    if len(index) == 0:
+        empty = np.array([])
+        return unique_labels, np.zeros((0, N_BINS)), empty, empty, empty
+
+    # 分組依日期排序，單純的日期範圍查詢會是一段連續區間，直接取切片 (view) 以免複製整塊直方圖；
+    # 只有排序後的索引仍是遞增的連續區間 (標籤排序未改變順序) 時，切片與 starts 的位置才一致
+    if np.all(np.diff(index) == 1):
+        rows = slice(index[0], index[-1] + 1)
+    else:
+        rows = index
+    selected = histograms['counts'][rows]
+    # 標籤數量 (交易類型、鯨魚或天數) 遠少於分組數，逐段 sum 比沿 axis=0 的 reduceat 快得多
+    bounds = np.append(starts, len(index))
+    counts = np.stack([selected[lo:hi].sum(axis=0, dtype=np.int64) for lo, hi in zip(bounds[:-1], bounds[1:])])
+    totals = np.add.reduceat(histograms['totals'][rows], starts)
+    mins = np.minimum.reduceat(histograms['mins'][rows], starts)
+    maxs = np.maximum.reduceat(histograms['maxs'][rows], starts)
+    return unique_labels, counts, totals, mins, maxs
+
+
+def gas_summary(histograms, percentiles=(50, 90, 99), by='kind', **filters):
+    """
+    依交易類型或鯨魚地址彙總 Gas 費用分佈 (合併預先彙總的直方圖)。
+
+    Args:
+        histograms (dict): build_daily_histograms 的回傳值。
+        percentiles (tuple): 要估算的百分位數。
+        by (str): 'kind' 依交易類型分組、'address' 依鯨魚分組、None 則整體彙總。
+        **filters: 傳給 select_groups 的條件 (start_date、end_date、addresses、kinds)。
+
+    Returns:
+        pandas.DataFrame: 每組的交易數、平均、最小、最大與百分位數 (單位：SUI)。
+    """
+    mask = select_groups(histograms, **filters)
+    if by is None:
+        unique_labels, merged, totals, mins, maxs = _merge_groups(histograms, mask, np.zeros(len(mask), dtype=np.int8))
+        unique_labels = np.full(len(unique_labels), '全部')
+    else:
+        labels = histograms['kinds' if by == 'kind' else 'addresses']
+        unique_labels, merged, totals, mins, maxs = _merge_groups(histograms, mask, labels)
+
+    tx_counts = merged.sum(axis=1)
+    estimates = histogram_percentiles(merged, percentiles, mins, maxs) if len(unique_labels) else np.empty((0, len(percentiles)))
+    summary = pd.DataFrame({
+        'group': unique_labels,
+        'transactions': tx_counts.astype(np.int64),
+        'mean_sui': totals / np.maximum(tx_counts, 1) / whale_analytics.MIST_PER_SUI,
+        'min_sui': mins / whale_analytics.MIST_PER_SUI,
+        'max_sui': maxs / whale_analytics.MIST_PER_SUI,
+    })
+    for i, p in enumerate(percentiles):
+        summary[f'p{p:g}_sui'] = estimates[:, i] / whale_analytics.MIST_PER_SUI
+    return summary
+
+
+def daily_percentiles(histograms, percentiles=(50, 90, 99), **filters):
+    """
+    計算每日的 Gas 費用百分位數 (同一天的各分組直方圖先相加)。
+
+    Returns:
+        pandas.DataFrame: 欄位為 'date'、'transactions' 與各百分位數 (單位：SUI)。
+    """
+    mask = select_groups(histograms, **filters)
+    days, merged, _, mins, maxs = _merge_groups(histograms, mask, histograms['dates'])
+
+    result = pd.DataFrame({'date': pd.to_datetime(days), 'transactions': merged.sum(axis=1).astype(np.int64)})
+    if len(days):
+        estimates = histogram_percentiles(merged, percentiles, mins, maxs)
+        for i, p in enumerate(percentiles):
+            result[f'p{p:g}_sui'] = estimates[:, i] / whale_analytics.MIST_PER_SUI
+    return result
+
+
+def raw_scan_percentiles(transactions, percentiles=(50, 90, 99), start_date=None, end_date=None,
+                         addresses=None, kinds=None):
+    """
+    直接掃描原始交易計算精確百分位數 (MIST)，作為基準比較與正確性驗證之用。
+    """
+    timestamps = pd.to_numeric(transactions['timestamp_ms'], errors='coerce')
+    gas = pd.to_numeric(transactions['total_gas_cost'], errors='coerce')
+    dates = pd.to_datetime(timestamps, unit='ms').dt.floor('D')
+    mask = timestamps.notna() & gas.notna()
+    if start_date is not None:
+        mask &= dates >= pd.Timestamp(start_date)
+    if end_date is not None:
+        mask &= dates <= pd.Timestamp(end_date)
+    if addresses is not None:
+        mask &= transactions['sender'].astype(str).isin(list(addresses))
+    if kinds is not None:
+        mask &= transactions['transaction_kind'].astype(str).isin(list(kinds))
+    values = gas[mask].to_numpy(dtype=np.float64)
+    if len(values) == 0:
+        return np.full(len(percentiles), np.nan)
+    return np.percentile(values, percentiles)
+
+
+def save_histograms(histograms, cache_path=DEFAULT_CACHE_PATH, signature=""):
+    """將預先彙總的直方圖 (連同分箱邊界) 以壓縮的 .npz 格式寫入磁碟。"""
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    np.savez_compressed(cache_path, source_signature=np.array(signature), bin_edges=BIN_EDGES, **histograms)
+
+
+def load_histograms(cache_path=DEFAULT_CACHE_PATH, signature=""):
+    """從磁碟讀取預先彙總的直方圖；快取不存在、來源或分箱已變更時回傳 None。"""
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as cached:
+            if str(cached['source_signature']) != signature or len(cached['bin_edges']) != len(BIN_EDGES) \
+                    or not np.allclose(cached['bin_edges'], BIN_EDGES):
+                return None
+            return {key: cached[key] for key in ('dates', 'addresses', 'kinds', 'counts', 'totals', 'mins', 'maxs')}
+    except Exception as e:
+        print(f"讀取 Gas 直方圖快取時發生錯誤：{e}")
+        return None
+
+
+def load_or_build_histograms(transactions, source_paths, cache_path=DEFAULT_CACHE_PATH):
+    """
+    優先讀取磁碟上的直方圖快取，來源檔案變更時才重新彙總並寫回快取。
+
+    Args:
+        transactions (pandas.DataFrame): 原始交易數據。
+        source_paths (list): 交易數據的來源檔案，用於快取失效判斷。
+        cache_path (str): 快取檔案路徑。
+
+    Returns:
+        dict: 預先彙總的直方圖。
+    """
+    signature = whale_cohort.source_signature(*source_paths)
+    histograms = load_histograms(cache_path, signature)
+    if histograms is not None:
+        return histograms
+
+    histograms = build_daily_histograms(transactions)
+    try:
+        save_histograms(histograms, cache_path, signature)
+    except Exception as e:
+        print(f"寫入 Gas 直方圖快取時發生錯誤：{e}")
+    return histograms
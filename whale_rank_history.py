@@ -0,0 +1,260 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# 排名歷史的預設儲存位置 (壓縮後的 .npz 檔)
+DEFAULT_HISTORY_PATH = "data/rank_history.npz"
+
+# 只追蹤前 N 名的排名變化
+DEFAULT_TOP_N = 100
+
+EVENT_ENTER = "enter"
+EVENT_EXIT = "exit"
+EVENT_MOVE = "move"
+
+_HISTORY_KEYS = ('dates', 'addresses', 'ranks', 'balances')
+_EVENT_KEYS = ('event_dates', 'event_addresses', 'event_types', 'event_prev_ranks', 'event_ranks')
+_LAST_KEYS = ('last_date', 'last_addresses', 'last_ranks')
+
+
+def make_snapshot(holders_df, top_n=DEFAULT_TOP_N, address_col='owner_address', balance_col='total_sui'):
+    """
+    將持有者列表轉換成「依地址排序」的排名快照。
+
+    排名依餘額降序決定，但快照本身依地址排序，
+    之後與其他快照比對時只需做合併 (merge join)，不必重新排序。
+
+    Args:
+        holders_df (pandas.DataFrame): 持有者列表，需包含地址與餘額欄位。
+        top_n (int): 只保留前 N 名。
+        address_col (str): 地址欄位名稱。
+        balance_col (str): 餘額欄位名稱。
+
+    Returns:
+        dict: 包含 'addresses'、'ranks'、'balances' 的 NumPy 陣列字典 (依地址排序)。
+    """
+    balances = pd.to_numeric(holders_df[balance_col], errors='coerce').to_numpy(dtype=np.float64)
+    addresses = holders_df[address_col].astype(str).to_numpy()
+    valid = ~np.isnan(balances)
+    balances, addresses = balances[valid], addresses[valid]
+
+    # 依餘額降序取前 N 名並給予排名 (同額時以地址排序，讓結果穩定)
+    by_balance = np.lexsort((addresses, -balances))[:top_n]
+    ranks = np.arange(1, len(by_balance) + 1, dtype=np.int32)
+
+    by_address = np.argsort(addresses[by_balance], kind='stable')
+    return {
+        'addresses': addresses[by_balance][by_address].astype(str),
+        'ranks': ranks[by_address],
+        'balances': balances[by_balance][by_address],
+    }
+
+
+def diff_snapshots(prev_addresses, prev_ranks, curr_addresses, curr_ranks):
+    """
+    以地址做排序合併 (sorted merge join)，找出兩個快照之間的進榜、出榜與名次變化。
+
+    兩邊的地址陣列都必須已依地址排序 (make_snapshot 的輸出即是)。
+
+    Returns:
+        pandas.DataFrame: 欄位為 'owner_address'、'event'、'prev_rank'、'rank'；
+                          出榜時 rank 為 0，進榜時 prev_rank 為 0。
+    """
+    # 在已排序的前一快照中二分搜尋目前的每個地址，等同於一次合併掃描
+    pos = np.searchsorted(prev_addresses, curr_addresses)
+    pos_clipped = np.minimum(pos, max(len(prev_addresses) - 1, 0))
+    if len(prev_addresses):
+        in_prev = prev_addresses[pos_clipped] == curr_addresses
+    else:
+        in_prev = np.zeros(len(curr_addresses), dtype=bool)
+
+    # 反向：前一快照中哪些地址已不在目前快照
+    back_pos = np.searchsorted(curr_addresses, prev_addresses)
+    back_clipped = np.minimum(back_pos, max(len(curr_addresses) - 1, 0))
+    if len(curr_addresses):
+        in_curr = curr_addresses[back_clipped] == prev_addresses
+    else:
+        in_curr = np.zeros(len(prev_addresses), dtype=bool)
+
+    matched_prev_ranks = np.where(in_prev, prev_ranks[pos_clipped] if len(prev_ranks) else 0, 0)
+    moved = in_prev & (matched_prev_ranks != curr_ranks)
+
+    entered = pd.DataFrame({
+        'owner_address': curr_addresses[~in_prev], 'event': EVENT_ENTER,
+        'prev_rank': 0, 'rank': curr_ranks[~in_prev],
+    })
+    exited = pd.DataFrame({
+        'owner_address': prev_addresses[~in_curr], 'event': EVENT_EXIT,
+        'prev_rank': prev_ranks[~in_curr], 'rank': 0,
+    })
+    moves = pd.DataFrame({
+        'owner_address': curr_addresses[moved], 'event': EVENT_MOVE,
+        'prev_rank': matched_prev_ranks[moved], 'rank': curr_ranks[moved],
+    })
+    events = pd.concat([entered, exited, moves], ignore_index=True)
+    events[['prev_rank', 'rank']] = events[['prev_rank', 'rank']].astype(np.int32)
+    return events
+
+
+def _empty_history():
+    return {
+        'dates': np.array([], dtype='datetime64[D]'),
+        'addresses': np.array([], dtype=str),
+        'ranks': np.array([], dtype=np.int32),
+        'balances': np.array([], dtype=np.float64),
+        'event_dates': np.array([], dtype='datetime64[D]'),
+        'event_addresses': np.array([], dtype=str),
+        'event_types': np.array([], dtype=str),
+        'event_prev_ranks': np.array([], dtype=np.int32),
+        'event_ranks': np.array([], dtype=np.int32),
+        'last_date': np.array('NaT', dtype='datetime64[D]'),
+        'last_addresses': np.array([], dtype=str),
+        'last_ranks': np.array([], dtype=np.int32),
+    }
+
+
+def load_history(history_path=DEFAULT_HISTORY_PATH):
+    """
+    從磁碟讀取排名歷史；檔案不存在時回傳空的歷史。
+
+    歷史紀錄依 (地址, 日期) 排序，作為「地址 → 排名時間序列」的索引。
+    """
+    if not os.path.exists(history_path):
+        return _empty_history()
+    try:
+        with np.load(history_path, allow_pickle=False) as stored:
+            return {key: stored[key] for key in _HISTORY_KEYS + _EVENT_KEYS + _LAST_KEYS}
+    except Exception as e:
+        print(f"讀取排名歷史時發生錯誤：{e}")
+        return _empty_history()
+
+
+def save_history(history, history_path=DEFAULT_HISTORY_PATH):
+    """將排名歷史以壓縮的 .npz 格式寫入磁碟。"""
+    history_dir = os.path.dirname(history_path)
+    if history_dir and not os.path.exists(history_dir):
+        os.makedirs(history_dir)
+    np.savez_compressed(history_path, **history)
+
+
+def append_snapshot(history, snapshot, snapshot_date):
+    """
+    將新的快照併入排名歷史，並記錄與上一個快照之間的變化。
+
+    新快照的日期必須晚於歷史中最後一個快照。
+    因為歷史依 (地址, 日期) 排序，且新日期一定最晚，
+    每一筆新紀錄只需插入在同地址區段的尾端，不必重新排序整個歷史。
+
+    Args:
+        history (dict): load_history 的回傳值。
+        snapshot (dict): make_snapshot 的回傳值。
+        snapshot_date (str | datetime.date): 快照日期。
+
+    Returns:
+        tuple: (更新後的 history, 本次變化的 DataFrame)；日期不合法時回傳 (history, None)。
+    """
+    snapshot_date = np.datetime64(pd.Timestamp(snapshot_date).date(), 'D')
+    last_date = history['last_date']
+    if not np.isnat(last_date) and snapshot_date <= last_date:
+        print(f"錯誤：快照日期 {snapshot_date} 必須晚於最後一次紀錄 {last_date}。")
+        return history, None
+
+    if np.isnat(last_date):
+        # 第一個快照沒有可以比較的對象，不產生任何事件
+        events = diff_snapshots(snapshot['addresses'], snapshot['ranks'], snapshot['addresses'], snapshot['ranks'])
+    else:
+        events = diff_snapshots(history['last_addresses'], history['last_ranks'],
+                                snapshot['addresses'], snapshot['ranks'])
+
+    # 在各地址區段的尾端插入新紀錄 (side='right' 保持同地址內依日期排序)
+    insert_at = np.searchsorted(history['addresses'], snapshot['addresses'], side='right')
+    n_new = len(snapshot['addresses'])
+    updated = {
+        'dates': np.insert(history['dates'], insert_at, np.full(n_new, snapshot_date)),
+        'addresses': np.insert(history['addresses'].astype(object), insert_at, snapshot['addresses']).astype(str),
+        'ranks': np.insert(history['ranks'], insert_at, snapshot['ranks']).astype(np.int32),
+        'balances': np.insert(history['balances'], insert_at, snapshot['balances']),
+        'event_dates': np.concatenate([history['event_dates'], np.full(len(events), snapshot_date)]),
+        'event_addresses': np.concatenate([history['event_addresses'].astype(object),
+                                           events['owner_address'].to_numpy(dtype=object)]).astype(str),
+        'event_types': np.concatenate([history['event_types'].astype(object),
+                                       events['event'].to_numpy(dtype=object)]).astype(str),
+        'event_prev_ranks': np.concatenate([history['event_prev_ranks'], events['prev_rank'].to_numpy()]).astype(np.int32),
+        'event_ranks': np.concatenate([history['event_ranks'], events['rank'].to_numpy()]).astype(np.int32),
+        'last_date': np.array(snapshot_date),
+        'last_addresses': snapshot['addresses'],
+        'last_ranks': snapshot['ranks'],
+    }
+    return updated, events
+
+
+def rank_over_time(history, address):
+    """
+    查詢單一地址的排名時間序列 (二分搜尋索引，不掃描整個歷史)。
+
+    Returns:
+        pandas.DataFrame: 欄位為 'snapshot_date'、'rank'、'balance'；
+                          地址從未進入前 N 名時回傳空表。
+    """
+    start = np.searchsorted(history['addresses'], address, side='left')
+    end = np.searchsorted(history['addresses'], address, side='right')
+    return pd.DataFrame({
+        'snapshot_date': pd.to_datetime(history['dates'][start:end]),
+        'rank': history['ranks'][start:end],
+        'balance': history['balances'][start:end],
+    })
+
+
+def events_table(history):
+    """以 DataFrame 形式回傳所有進榜、出榜與名次變化紀錄。"""
+    return pd.DataFrame({
+        'snapshot_date': pd.to_datetime(history['event_dates']),
+        'owner_address': history['event_addresses'],
+        'event': history['event_types'],
+        'prev_rank': history['event_prev_ranks'],
+        'rank': history['event_ranks'],
+    })
+
+
+def latest_movements(history):
+    """
+    取得最近一次快照相對於前一次快照的排名變化，供主頁的鯨魚卡片顯示箭頭。
+
+    Returns:
+        dict: 地址 → 名次變化 (正數代表名次上升)；新進榜的地址值為 None。
+              未變動的地址不會出現在字典中。
+    """
+    last_date = history['last_date']
+    if np.isnat(last_date):
+        return {}
+    latest = history['event_dates'] == last_date
+    movements = {}
+    for address, event, prev_rank, rank in zip(history['event_addresses'][latest], history['event_types'][latest],
+                                                history['event_prev_ranks'][latest], history['event_ranks'][latest]):
+        if event == EVENT_ENTER:
+            movements[str(address)] = None
+        elif event == EVENT_MOVE:
+            movements[str(address)] = int(prev_rank) - int(rank)
+    return movements
+
+
+def record_snapshot(holders_df, snapshot_date, history_path=DEFAULT_HISTORY_PATH, top_n=DEFAULT_TOP_N,
+                    address_col='owner_address', balance_col='total_sui'):
+    """
+    讀取排名歷史、併入新快照並寫回磁碟。
+
+    Returns:
+        pandas.DataFrame: 本次快照的變化；失敗時回傳 None。
+    """
+    history = load_history(history_path)
+    snapshot = make_snapshot(holders_df, top_n, address_col, balance_col)
+    history, events = append_snapshot(history, snapshot, snapshot_date)
+    if events is None:
+        return None
+    try:
+        save_history(history, history_path)
+    except Exception as e:
+        print(f"寫入排名歷史時發生錯誤：{e}")
+        return None
+    return events